@@ -0,0 +1,27 @@
+"""Redis cache backend counting the lookups of the current request."""
+from django_redis.cache import RedisCache
+
+from base.middleware import record_cache_lookup
+
+_missing = object()
+
+
+class InstrumentedRedisCache(RedisCache):
+    """
+    The django-redis backend, recording hits and misses in the stats of the 
+    request being handled, see base.middleware.RequestMetricsMiddleware.
+    """
+
+    def get(self, key, default=None, version=None, client=None):
+        value = super().get(key, _missing, version=version, client=client)
+        if value is _missing:
+            record_cache_lookup(0, 1)
+            return default
+        record_cache_lookup(1)
+        return value
+
+    def get_many(self, keys, *args, **kwargs):
+        keys = list(keys)
+        values = super().get_many(keys, *args, **kwargs)
+        record_cache_lookup(len(values), len(keys) - len(values))
+        return values
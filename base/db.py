@@ -1,4 +1,6 @@
-from django.db import models
+from uuid import uuid4
+
+from django.db import connections, models, transaction
 from django.contrib.gis.geos import GEOSGeometry
 
 class GeoJSONField(models.JSONField):
@@ -149,4 +151,39 @@ class LatLongField(models.CharField):
             A string representation of the field's value.
         """
         value = self.value_from_object(obj)
-        return self.get_prep_value(value)
\ No newline at end of file
+        return self.get_prep_value(value)
+
+def server_side_iterator(queryset, chunk_size=2000):
+    """
+    Yields the rows of a queryset from a server-side (named) cursor.
+
+    ``DISABLE_SERVER_SIDE_CURSORS`` turns off Django's own chunked cursors,
+    so ``QuerySet.iterator`` would still load the whole result set into the
+    worker. This opens a named psycopg2 cursor inside a transaction, which
+    keeps only ``chunk_size`` rows in memory at a time and also works behind
+    a transaction pooler.
+
+    The rows are returned as plain tuples straight from the database driver,
+    without Django's field converters, so the queryset should only select
+    plain columns (``values_list`` of strings and numbers).
+
+    Args:
+        queryset (QuerySet): The queryset to iterate.
+        chunk_size (int): The number of rows fetched per round trip.
+
+    Yields:
+        tuple: The database rows.
+    """
+    sql, params = queryset.query.sql_with_params()
+    connection = connections[queryset.db]
+    with transaction.atomic(using=queryset.db):
+        connection.ensure_connection()
+        cursor_name = f"stream_{uuid4().hex}"
+        with connection.connection.cursor(name=cursor_name) as cursor:
+            cursor.itersize = chunk_size
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
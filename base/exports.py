@@ -0,0 +1,98 @@
+"""Helpers to export table rows as downloadable CSV and XLSX files."""
+import csv
+import tempfile
+from urllib.parse import quote
+
+import xlsxwriter
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.text import slugify
+
+CSV_CONTENT_TYPE = "text/csv"
+XLSX_CONTENT_TYPE = (
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+
+class Echo:
+    """
+    A file-like object that returns what is written instead of buffering it.
+
+    Used with ``csv.writer`` so every row is formatted and handed straight to
+    the streaming response.
+    """
+
+    def write(self, value):
+        """Returns the written value."""
+        return value
+
+
+def content_disposition(filename):
+    """
+    Builds an attachment ``Content-Disposition`` header value.
+
+    The plain ``filename`` parameter only holds a safe ASCII version of the
+    name, the original name is sent in the RFC 5987 ``filename*`` parameter.
+
+    Args:
+        filename (str): The file name including the extension.
+
+    Returns:
+        str: The header value.
+    """
+    name, _, extension = filename.rpartition(".")
+    ascii_name = f"{slugify(name) or 'export'}.{extension}"
+    return (f'attachment; filename="{ascii_name}"; '
+            f"filename*=utf-8''{quote(filename)}")
+
+
+def csv_response(filename, head, rows):
+    """
+    Returns a response streaming the rows as CSV.
+
+    Args:
+        filename (str): The name of the downloaded file.
+        head (list): The column titles.
+        rows (iterable): The rows, consumed lazily while streaming.
+
+    Returns:
+        StreamingHttpResponse: The CSV response.
+    """
+    writer = csv.writer(Echo())
+
+    def stream():
+        yield writer.writerow(head)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(stream(), content_type=CSV_CONTENT_TYPE)
+    response["Content-Disposition"] = content_disposition(filename)
+    return response
+
+
+def xlsx_response(filename, head, rows):
+    """
+    Returns a response with the rows written to an XLSX workbook.
+
+    The workbook is written in XlsxWriter's ``constant_memory`` mode, which
+    flushes every row to a temporary file, and the result is streamed from
+    disk, so the rows are never held in memory together.
+
+    Args:
+        filename (str): The name of the downloaded file.
+        head (list): The column titles.
+        rows (iterable): The rows to write.
+
+    Returns:
+        FileResponse: The XLSX response.
+    """
+    output = tempfile.TemporaryFile()
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    worksheet = workbook.add_worksheet()
+    worksheet.write_row(0, 0, head)
+    for index, row in enumerate(rows, start=1):
+        worksheet.write_row(index, 0, row)
+    workbook.close()
+    output.seek(0)
+
+    response = FileResponse(output, content_type=XLSX_CONTENT_TYPE)
+    response["Content-Disposition"] = content_disposition(filename)
+    return response
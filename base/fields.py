@@ -1,5 +1,6 @@
 from datetime import datetime
 
+import orjson
 from django.conf import settings
 from hashid_field.field import Hashid
 from pytz import timezone
@@ -86,8 +87,8 @@ class SerializableRelatedField(serializers.PrimaryKeyRelatedField):
         if not value:
             return None
         if isinstance(value, Hashid):
-            return value
-        return value.pk
+            return str(value)
+        return str(value.pk)
 
     def to_representation(self, value):
         """Serializes the related object using the specified serializer.
@@ -108,3 +109,73 @@ class SerializableRelatedField(serializers.PrimaryKeyRelatedField):
         return self.single_to_representation(value)
 
 
+
+
+class HashidRelatedField(serializers.PrimaryKeyRelatedField):
+    """A primary key related field returning the hashid string of the 
+    related object.
+
+    The ids are converted while serializing, so the renderer encodes plain 
+    strings instead of falling back to its encoder hook for every Hashid.
+    """
+
+    def to_representation(self, value):
+        """Returns the hashid of the related object.
+
+        Args:
+            value: The related object, or its primary key only.
+
+        Returns:
+            str: The hashid.
+        """
+        return str(value.pk)
+
+
+class RawJSONField(serializers.JSONField):
+    """A JSONField rendering the JSON text annotated on the instance 
+    verbatim.
+
+    When the instance has the `raw_source` attribute, e.g. annotated by 
+    `FarmQuerySet.with_raw_geo_json`, its text is wrapped in an 
+    `orjson.Fragment`, which the renderer copies into the response without 
+    decoding it. Otherwise the field behaves like a JSONField, including 
+    when writing.
+    """
+
+    def __init__(self, raw_source=None, **kwargs):
+        """
+        Constructor of the field.
+
+        Args:
+            raw_source (str, optional): The attribute holding the JSON text
+                of the value.
+        """
+        self.raw_source = raw_source
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        """Returns the JSON text of the value when annotated.
+
+        Args:
+            instance: The serialized object.
+
+        Returns:
+            The `orjson.Fragment` of the JSON text, or the value.
+        """
+        if self.raw_source and hasattr(instance, self.raw_source):
+            text = getattr(instance, self.raw_source)
+            return None if text is None else orjson.Fragment(text)
+        return super().get_attribute(instance)
+
+    def to_representation(self, value):
+        """Returns the fragments as they are.
+
+        Args:
+            value: The value, or the `orjson.Fragment` of its JSON text.
+
+        Returns:
+            The representation of the value.
+        """
+        if isinstance(value, orjson.Fragment):
+            return value
+        return super().to_representation(value)
@@ -0,0 +1,56 @@
+"""Memoized hashid encoding for the HashidAutoField ids."""
+from functools import lru_cache
+
+from django.conf import settings
+from hashid_field import HashidAutoField
+from hashids import Hashids
+
+
+class CachedHashids(Hashids):
+    """
+    A Hashids codec remembering the most recently encoded ids and decoded
+    hashids.
+
+    Every id loaded from the database, primary keys and foreign keys alike,
+    is encoded into a new Hashid object, and the same ids come back in every
+    response, so a bounded LRU skips most of the encoding work.
+    """
+
+    def __init__(self, *args, cache_size=None, **kwargs):
+        """
+        Constructor of the codec.
+
+        Args:
+            cache_size (int, optional): The maximum number of ids and
+                hashids remembered, defaults to settings.HASHID_CACHE_SIZE.
+        """
+        super().__init__(*args, **kwargs)
+        cache_size = cache_size or settings.HASHID_CACHE_SIZE
+        self.encode = lru_cache(maxsize=cache_size)(self.encode)
+        self.decode = lru_cache(maxsize=cache_size)(self.decode)
+
+
+@lru_cache
+def get_hashids(salt, min_length, alphabet):
+    """
+    Returns the codec shared by all the fields with the same salt, minimum
+    length and alphabet.
+    """
+    return CachedHashids(salt=salt, min_length=min_length, alphabet=alphabet)
+
+
+class CachedHashidAutoField(HashidAutoField):
+    """
+    A HashidAutoField encoding its ids with the shared CachedHashids codec.
+
+    It is interchangeable with HashidAutoField in the database and in the
+    migrations.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._hashids = get_hashids(self.salt, self.min_length, self.alphabet)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        return name, "hashid_field.field.HashidAutoField", args, kwargs
@@ -0,0 +1,130 @@
+"""Per request query, cache and rendering instrumentation."""
+import logging
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("navigate.requests")
+
+# Stats of the request handled by the current thread or task
+_request_stats = ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    """
+    Counters of the work done while handling a request.
+
+    Attributes:
+        queries (int): The number of SQL queries.
+        sql_time (float): The time spent in SQL queries, in seconds.
+        cache_hits (int): The cache lookups that found a value.
+        cache_misses (int): The cache lookups that found nothing.
+        render_time (float): The time spent rendering the response body,
+            in seconds.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.render_time = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper timing every query of the request.
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+
+
+def get_request_stats():
+    """
+    Returns the RequestStats of the current request, None outside of one.
+    """
+    return _request_stats.get()
+
+
+def record_cache_lookup(hits, misses=0):
+    """
+    Counts cache lookups of the current request.
+
+    Args:
+        hits (int): The keys found.
+        misses (int): The keys not found.
+    """
+    stats = get_request_stats()
+    if stats:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the SQL queries, cache lookups and rendering time of every
+    request.
+
+    The numbers are sent in a `Server-Timing` header, visible in the network
+    tab of the browser, and logged to the `navigate.requests` logger, at
+    warning level when the request exceeded settings.SLOW_REQUEST_THRESHOLD
+    milliseconds or settings.REQUEST_QUERY_THRESHOLD queries, so N+1 query
+    regressions show up in the production logs.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.record_query))
+                response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        duration = time.perf_counter() - start
+
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = ", ".join([
+                f'db;dur={stats.sql_time * 1000:.1f};'
+                f'desc="{stats.queries} queries"',
+                f'cache;desc="{stats.cache_hits} hits '
+                f'{stats.cache_misses} misses"',
+                f"render;dur={stats.render_time * 1000:.1f}",
+                f"total;dur={duration * 1000:.1f}",
+            ])
+
+        slow = (
+            duration * 1000 > settings.SLOW_REQUEST_THRESHOLD
+            or stats.queries > settings.REQUEST_QUERY_THRESHOLD)
+        logger.log(
+            logging.WARNING if slow else logging.INFO,
+            "%s %s %s %.1fms %d queries %.1fms sql %d cache hits "
+            "%d cache misses %.1fms render",
+            request.method, request.path, response.status_code,
+            duration * 1000, stats.queries, stats.sql_time * 1000,
+            stats.cache_hits, stats.cache_misses, stats.render_time * 1000,
+            extra={
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "duration_ms": round(duration * 1000, 1),
+                "queries": stats.queries,
+                "sql_ms": round(stats.sql_time * 1000, 1),
+                "cache_hits": stats.cache_hits,
+                "cache_misses": stats.cache_misses,
+                "render_ms": round(stats.render_time * 1000, 1),
+                "slow": slow,
+            })
+        return response
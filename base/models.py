@@ -1,7 +1,8 @@
 from django.db import models
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
-from hashid_field import HashidAutoField
+
+from base.hashid import CachedHashidAutoField
 
 
 class AbstractBaseModel(models.Model):
@@ -14,7 +15,7 @@ class AbstractBaseModel(models.Model):
         updated_on(datetime): Last updated date of the object
     """
 
-    id = HashidAutoField(primary_key=True)
+    id = CachedHashidAutoField(primary_key=True)
     creator = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         default=None,
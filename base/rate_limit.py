@@ -0,0 +1,78 @@
+"""A token bucket rate limiter shared by all workers through Redis."""
+import time
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+# Refills the bucket for the time since the last call and takes a token.
+# Returns the seconds to wait until a token is available, "0" if one was
+# taken. The Redis clock is used so all workers agree on the time.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated',
+           tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class TokenBucket:
+    """
+    A token bucket with its state in Redis, so every worker process takes
+    tokens from the same bucket.
+
+    Attributes:
+        key (str): The cache key of the bucket.
+        rate (float): The tokens added per second, the sustained rate.
+        capacity (int): The maximum number of tokens, the allowed burst.
+    """
+
+    def __init__(self, key, rate, capacity=None):
+        """
+        Constructor for the bucket.
+
+        Args:
+            key (str): The name of the bucket.
+            rate (float): The tokens added per second.
+            capacity (int, optional): The maximum number of tokens, defaults
+                to one second of tokens.
+        """
+        self.key = cache.make_key(f"token-bucket-{key}")
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+
+    def try_acquire(self):
+        """
+        Takes a token if one is available.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until one
+                is available.
+        """
+        connection = get_redis_connection("default")
+        wait = connection.eval(
+            TOKEN_BUCKET_SCRIPT, 1, self.key, self.rate, self.capacity)
+        return float(wait)
+
+    def acquire(self):
+        """
+        Blocks until a token is taken.
+        """
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
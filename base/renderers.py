@@ -1,8 +1,18 @@
 """Custom render class to custom success response."""
+import datetime
+import decimal
+import time
+from collections.abc import Mapping
+
+import orjson
+from django.db.models.query import QuerySet
+from django.utils.functional import Promise
 from hashid_field import Hashid
 from rest_framework.renderers import JSONRenderer
 from rest_framework.utils.encoders import JSONEncoder
 
+from base.middleware import get_request_stats
+
 
 class HashIDJSONEncoder(JSONEncoder):
     """A JSONEncoder subclass that can encode objects of the Hashid class.
@@ -47,38 +57,72 @@ class HashIDJSONEncoder(JSONEncoder):
         return super().default(o)
 
 
-class HashIDRenderer(JSONRenderer):
+def encode_default(o):
+    """
+    Converts the objects orjson can not encode natively.
+
+    Hashids become their string, lazy translation strings their translation,
+    decimals floats and querysets, generators and other iterables lists,
+    like DRF's JSONEncoder does.
+
+    Args:
+        o (Any): The object to encode.
+
+    Returns:
+        Any: A value orjson can encode.
+
+    Raises:
+        TypeError: If the object can not be encoded.
     """
-    A custom renderer that serializes data using JSON format and encodes
-    sensitive information using HashID encoding.
+    if isinstance(o, (Hashid, Promise)):
+        return str(o)
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+    if isinstance(o, datetime.timedelta):
+        return str(o.total_seconds())
+    if isinstance(o, QuerySet):
+        return list(o)
+    if isinstance(o, bytes):
+        return o.decode()
+    if hasattr(o, "tolist"):
+        return o.tolist()
+    if hasattr(o, "__iter__"):
+        return list(o)
+    raise TypeError(f"Type is not JSON serializable: {type(o).__name__}")
+
+
+class HashIDRenderer(JSONRenderer):
     """
+    A custom renderer that wraps the response data in the success envelope
+    and serializes it with orjson, encoding Hashid objects as their string.
 
-    encoder_class = HashIDJSONEncoder
+    orjson encodes dicts, lists, strings, numbers, datetimes, dates, UUIDs
+    and numpy arrays natively, only the other objects go through
+    `encode_default`.
+    """
 
     def render(self, data, accepted_media_type=None, renderer_context=None):
         """Custom render function."""
+        renderer_context = renderer_context or {}
         response_data = data
-        try:
-            if not data["success"]:
-                response_data = data
-        except Exception:
+        if not isinstance(data, Mapping) or "success" not in data:
             response_data = {
                 "success": True,
                 "errors": [],
                 "code": renderer_context["response"].status_code,
                 "data": data,
             }
-        try:
-            getattr(
-                renderer_context.get("view").get_serializer().Meta,
-                "resource_name",
-                "objects",
-            )
-        except Exception:
-            pass
-
-        response = super().render(
-            response_data, accepted_media_type, renderer_context
-        )
+
+        option = (
+            orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            | orjson.OPT_UTC_Z)
+        if self.get_indent(accepted_media_type, renderer_context):
+            option |= orjson.OPT_INDENT_2
+        start = time.perf_counter()
+        response = orjson.dumps(
+            response_data, default=encode_default, option=option)
+        stats = get_request_stats()
+        if stats:
+            stats.render_time += time.perf_counter() - start
 
         return response
@@ -0,0 +1,147 @@
+"""Sampling of the Sentry performance traces."""
+import random
+from datetime import datetime
+from urllib.parse import urlsplit
+
+
+def parse_sample_rates(value):
+    """
+    Parses per endpoint sample rates, e.g.
+    "/navigate/farms/stats/=0.01,daily_analysis_sync=0.5".
+
+    Args:
+        value (str): Comma separated path prefix or task name and rate
+            pairs.
+
+    Returns:
+        dict: The rates keyed by path prefix or task name.
+    """
+    rates = {}
+    for item in filter(None, value.split(",")):
+        key, rate = item.rsplit("=", 1)
+        rates[key.strip()] = float(rate)
+    return rates
+
+
+def get_timestamp(value):
+    """
+    Returns a transaction timestamp, a datetime, an ISO string or a float,
+    in seconds since the epoch.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+class TraceSampler:
+    """
+    Samples the Sentry transactions of every endpoint and Celery task at
+    their own rate, while keeping the slow and errored ones of a larger
+    recorded share.
+
+    The SDK decides whether to record a transaction when it starts, before
+    its duration or outcome is known. So `traces_sampler` records
+    transactions at `record_rate`, or at their endpoint's rate if higher,
+    and `before_send_transaction` keeps the recorded transactions that were
+    slower than `slow_threshold`, or `slow_task_threshold` for tasks, or did
+    not end with an ok status, and drops the others down to their
+    endpoint's rate. Recording is what costs, so the slow and errored
+    transactions are kept among the recorded share only, e.g. 20% of the
+    stats requests for an endpoint rate of 1% and a record rate of 20%.
+
+    Transactions continuing a trace keep the recording decision of their
+    parent. The send decision is taken per transaction, so a slow task of a
+    fast request is kept without the request.
+    """
+
+    def __init__(self, default_rate, task_rate, endpoint_rates,
+                 record_rate=0.2, slow_threshold=1000,
+                 slow_task_threshold=600000):
+        """
+        Constructor of the sampler.
+
+        Args:
+            default_rate (float): The rate of the other requests.
+            task_rate (float): The rate of the other Celery tasks.
+            endpoint_rates (dict): Rates keyed by path prefix or task name.
+                Requests are matched on the longest prefix, tasks on their
+                name.
+            record_rate (float): The rate transactions are recorded at, the
+                share of the slow and errored transactions that is kept.
+                Endpoints with a higher rate are recorded at their rate.
+            slow_threshold (float): The duration in milliseconds above which
+                a request is always kept.
+            slow_task_threshold (float): The duration in milliseconds above
+                which a Celery task is always kept.
+        """
+        self.default_rate = default_rate
+        self.task_rate = task_rate
+        self.endpoint_rates = endpoint_rates
+        self.record_rate = record_rate
+        self.slow_threshold = slow_threshold
+        self.slow_task_threshold = slow_task_threshold
+        self.prefixes = sorted(
+            (key for key in endpoint_rates if key.startswith("/")),
+            key=len, reverse=True)
+
+    def get_rate(self, path=None, task=None):
+        """
+        Returns the sample rate of a request path or of a task name.
+        """
+        if task:
+            return self.endpoint_rates.get(task, self.task_rate)
+        for prefix in self.prefixes:
+            if (path or "").startswith(prefix):
+                return self.endpoint_rates[prefix]
+        return self.default_rate
+
+    def get_record_rate(self, rate):
+        """
+        Returns the rate transactions sampled at `rate` are recorded at, 0
+        for disabled endpoints.
+        """
+        return max(rate, self.record_rate) if rate else 0.0
+
+    def traces_sampler(self, sampling_context):
+        """The `traces_sampler` of the SDK, deciding what is recorded."""
+        parent_sampled = sampling_context.get("parent_sampled")
+        if parent_sampled is not None:
+            return float(parent_sampled)
+        celery_job = sampling_context.get("celery_job")
+        if celery_job:
+            rate = self.get_rate(task=celery_job.get("task"))
+        else:
+            environ = sampling_context.get("wsgi_environ") or {}
+            rate = self.get_rate(path=environ.get("PATH_INFO", ""))
+        return self.get_record_rate(rate)
+
+    def before_send_transaction(self, event, hint):
+        """
+        The `before_send_transaction` hook of the SDK, keeping the slow and
+        errored transactions and the endpoint's share of the others.
+        """
+        trace = event.get("contexts", {}).get("trace", {})
+        status = trace.get("status") or event.get("tags", {}).get("status")
+        if status not in (None, "ok"):
+            return event
+        try:
+            duration = get_timestamp(event["timestamp"]) - get_timestamp(
+                event["start_timestamp"])
+        except (KeyError, TypeError, ValueError):
+            duration = 0
+
+        if str(trace.get("op", "")).startswith("queue.task"):
+            threshold = self.slow_task_threshold
+            rate = self.get_rate(task=event.get("transaction"))
+        else:
+            threshold = self.slow_threshold
+            url = event.get("request", {}).get("url") or ""
+            rate = self.get_rate(path=urlsplit(url).path)
+        if duration * 1000 > threshold:
+            return event
+        record_rate = self.get_record_rate(rate)
+        if record_rate and random.random() < rate / record_rate:
+            return event
+        return None
@@ -1,7 +1,15 @@
 from rest_framework import serializers
 
+from base.fields import HashidRelatedField
+
+
 class IDModelSerializer(serializers.ModelSerializer):
     """
     Serializer class for models with an 'id' field.
+
+    The ids of the instance and its related objects are serialized as 
+    hashid strings.
     """
+    serializer_related_field = HashidRelatedField
+
     id = serializers.CharField(read_only=True)
\ No newline at end of file
@@ -0,0 +1,106 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from base.sentry import TraceSampler, parse_sample_rates
+
+START = "2024-01-01T12:00:00Z"
+
+
+def request_event(path, duration, status="ok"):
+    """Returns a request transaction of `duration` seconds."""
+    return {
+        "contexts": {"trace": {"op": "http.server", "status": status}},
+        "request": {"url": f"https://navigate.example.com{path}"},
+        "start_timestamp": START,
+        "timestamp": 1704110400 + duration,
+    }
+
+
+def task_event(name, duration, status="ok"):
+    """Returns a Celery task transaction of `duration` seconds."""
+    return {
+        "contexts": {"trace": {"op": "queue.task.celery", "status": status}},
+        "transaction": name,
+        "start_timestamp": START,
+        "timestamp": 1704110400 + duration,
+    }
+
+
+class TraceSamplerTest(SimpleTestCase):
+    """Tests the keep and drop decisions of the Sentry sampler."""
+
+    def setUp(self):
+        self.sampler = TraceSampler(
+            0.1, 0.1, parse_sample_rates(
+                "/navigate/farms/stats/=0.01,/navigate/metrics/=0,"
+                "daily_analysis_sync=0.5"),
+            record_rate=0.2, slow_threshold=1000, slow_task_threshold=60000)
+
+    def test_parse_sample_rates(self):
+        self.assertEqual(
+            parse_sample_rates("/a/=0.01, b=0.5,"), {"/a/": 0.01, "b": 0.5})
+
+    def test_get_rate(self):
+        self.assertEqual(
+            self.sampler.get_rate(path="/navigate/farms/stats/1/"), 0.01)
+        self.assertEqual(self.sampler.get_rate(path="/navigate/farms/"), 0.1)
+        self.assertEqual(
+            self.sampler.get_rate(task="daily_analysis_sync"), 0.5)
+        self.assertEqual(self.sampler.get_rate(task="analysis_sync"), 0.1)
+
+    def test_records_at_the_record_rate(self):
+        traces_sampler = self.sampler.traces_sampler
+        self.assertEqual(traces_sampler(
+            {"wsgi_environ": {"PATH_INFO": "/navigate/farms/stats/"}}), 0.2)
+        self.assertEqual(traces_sampler(
+            {"wsgi_environ": {"PATH_INFO": "/navigate/farms/"}}), 0.2)
+        self.assertEqual(traces_sampler(
+            {"celery_job": {"task": "daily_analysis_sync"}}), 0.5)
+
+    def test_does_not_record_disabled_endpoints(self):
+        self.assertEqual(self.sampler.traces_sampler(
+            {"wsgi_environ": {"PATH_INFO": "/navigate/metrics/"}}), 0)
+
+    def test_follows_the_parent_decision(self):
+        self.assertEqual(self.sampler.traces_sampler({
+            "parent_sampled": True,
+            "wsgi_environ": {"PATH_INFO": "/navigate/metrics/"},
+        }), 1.0)
+        self.assertEqual(self.sampler.traces_sampler({
+            "parent_sampled": False,
+            "wsgi_environ": {"PATH_INFO": "/navigate/farms/"},
+        }), 0.0)
+
+    @mock.patch("base.sentry.random.random", return_value=0.99)
+    def test_keeps_slow_and_errored_transactions(self, _):
+        before_send = self.sampler.before_send_transaction
+        events = [
+            request_event("/navigate/farms/stats/", 1.5),
+            request_event("/navigate/farms/stats/", 0.1, "internal_error"),
+            task_event("analysis_sync", 61),
+            task_event("analysis_sync", 1, "internal_error"),
+        ]
+        for event in events:
+            self.assertIs(before_send(event, {}), event)
+
+    @mock.patch("base.sentry.random.random", return_value=0.99)
+    def test_drops_fast_transactions_above_their_rate(self, _):
+        before_send = self.sampler.before_send_transaction
+        self.assertIsNone(
+            before_send(request_event("/navigate/farms/stats/", 0.1), {}))
+        # A slow request is a fast task
+        self.assertIsNone(before_send(task_event("analysis_sync", 30), {}))
+
+    def test_keeps_fast_transactions_at_their_rate(self):
+        before_send = self.sampler.before_send_transaction
+        event = request_event("/navigate/farms/", 0.1)
+        # Recorded at 0.2, kept at 0.1
+        with mock.patch("base.sentry.random.random", return_value=0.49):
+            self.assertIs(before_send(event, {}), event)
+        with mock.patch("base.sentry.random.random", return_value=0.51):
+            self.assertIsNone(before_send(event, {}))
+        # Recorded at their own rate, all kept
+        event = task_event("daily_analysis_sync", 1)
+        with mock.patch("base.sentry.random.random", return_value=0.99):
+            self.assertIs(before_send(event, {}), event)
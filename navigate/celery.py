@@ -5,6 +5,7 @@ from __future__ import absolute_import, unicode_literals
 import os
 
 from celery import Celery
+from celery.signals import worker_process_shutdown, worker_ready
 from django.conf import settings
 
 # Set the default Django settings module for the 'celery' program.
@@ -28,3 +29,18 @@ app.conf.timezone = "UTC"
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 
 app.conf.broker_connection_retry_on_startup = True
+
+
+@worker_ready.connect
+def start_metrics_exporter(**kwargs):
+    """Serves the worker metrics if settings.CELERY_METRICS_PORT is set."""
+    if settings.CELERY_METRICS_PORT:
+        from v1.farms.metrics import start_exporter
+        start_exporter(settings.CELERY_METRICS_PORT)
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    """Drops the live metrics of a stopped pool process."""
+    from v1.farms.metrics import mark_process_dead
+    mark_process_dead(pid or os.getpid())
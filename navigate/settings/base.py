@@ -15,6 +15,7 @@ from pathlib import Path
 import sentry_sdk
 from celery.schedules import crontab
 
+from base.sentry import TraceSampler, parse_sample_rates
 from base.utils import get_domain
 
 from . import env
@@ -65,6 +66,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'base.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     # CORS header middlewares
@@ -159,7 +161,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 CACHES = {
     "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
+        "BACKEND": "base.cache.InstrumentedRedisCache",
         "LOCATION": f"{REDIS_URL}:{REDIS_PORT}/1",
         "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
         "KEY_PREFIX": "navigate_django",
@@ -222,6 +224,8 @@ EMAIL_USE_TLS = True
 EMAIL_USE_SSL = False
 
 HASHID_FIELD_SALT = env.get("HASHID_SALT")
+# Ids and hashids remembered by the hashid codec, see base/hashid.py
+HASHID_CACHE_SIZE = int(env.get("HASHID_CACHE_SIZE", default=100000))
 
 # Cors setup
 
@@ -254,28 +258,116 @@ TOTP_SECRET = env.get("TOTP_SECRET")
 STATIC_URL = "/static/"
 STATIC_ROOT = "static/"
 
+# Sentry performance sampling, the rate of every request and Celery task, 
+# overridden per path prefix or task name with SENTRY_ENDPOINT_SAMPLE_RATES.
+# Transactions are recorded at SENTRY_TRACES_RECORD_RATE, or at their own 
+# rate if higher, and the recorded requests slower than 
+# SENTRY_SLOW_REQUEST_THRESHOLD and tasks slower than 
+# SENTRY_SLOW_TASK_THRESHOLD milliseconds, or failing, are always kept, see 
+# base/sentry.py. The profiled share applies to the recorded transactions.
+SENTRY_TRACES_SAMPLE_RATE = float(
+    env.get("SENTRY_TRACES_SAMPLE_RATE", default=0.1))
+SENTRY_TASK_TRACES_SAMPLE_RATE = float(
+    env.get("SENTRY_TASK_TRACES_SAMPLE_RATE", default=0.1))
+SENTRY_TRACES_RECORD_RATE = float(
+    env.get("SENTRY_TRACES_RECORD_RATE", default=0.2))
+SENTRY_SLOW_REQUEST_THRESHOLD = int(
+    env.get("SENTRY_SLOW_REQUEST_THRESHOLD", default=1000))
+SENTRY_SLOW_TASK_THRESHOLD = int(
+    env.get("SENTRY_SLOW_TASK_THRESHOLD", default=10 * 60 * 1000))
+SENTRY_PROFILES_SAMPLE_RATE = float(
+    env.get("SENTRY_PROFILES_SAMPLE_RATE", default=0.05))
+SENTRY_ENDPOINT_SAMPLE_RATES = parse_sample_rates(env.get(
+    "SENTRY_ENDPOINT_SAMPLE_RATES", 
+    default="/navigate/farms/stats/=0.01,"
+            "/navigate/farms/farms/geo-jsons/=0.01,"
+            "/navigate/metrics/=0"))
+
+trace_sampler = TraceSampler(
+    SENTRY_TRACES_SAMPLE_RATE, SENTRY_TASK_TRACES_SAMPLE_RATE, 
+    SENTRY_ENDPOINT_SAMPLE_RATES, record_rate=SENTRY_TRACES_RECORD_RATE, 
+    slow_threshold=SENTRY_SLOW_REQUEST_THRESHOLD, 
+    slow_task_threshold=SENTRY_SLOW_TASK_THRESHOLD)
 sentry_sdk.init(
     dsn=env.get("SENTRY_DSN"),
-    # Set traces_sample_rate to 1.0 to capture 100%
-    # of transactions for performance monitoring.
-    traces_sample_rate=1.0,
-    # Set profiles_sample_rate to 1.0 to profile 100%
-    # of sampled transactions.
-    # We recommend adjusting this value in production.
-    profiles_sample_rate=1.0,
+    # Errors are always reported, only the performance traces are sampled
+    traces_sampler=trace_sampler.traces_sampler,
+    before_send_transaction=trace_sampler.before_send_transaction,
+    profiles_sample_rate=SENTRY_PROFILES_SAMPLE_RATE,
     environment=ENVIRONMENT,
 )
 
 #earth engine
 EE_SERVICE_ACCOUNT = env.get("EE_SERVICE_ACCOUNT", default="")
 EE_SERVICE_ACCOUNT_CREDENTIAL_PATH = env.get("EE_SERVICE_ACCOUNT_CREDENTIAL_PATH", default="")
-
-
+# Earth Engine requests per second and burst shared by all workers, and the
+# retries of rate limited and server errors, backing off exponentially from
+# EE_BACKOFF_BASE up to EE_BACKOFF_MAX seconds
+EE_REQUESTS_PER_SECOND = float(env.get("EE_REQUESTS_PER_SECOND", default=10))
+EE_REQUEST_BURST = int(env.get("EE_REQUEST_BURST", default=20))
+EE_MAX_RETRIES = int(env.get("EE_MAX_RETRIES", default=5))
+EE_BACKOFF_BASE = 1
+EE_BACKOFF_MAX = 60
+# Attempts of an analysis failing with temporary errors before it is moved
+# to the dead letter state
+ANALYSIS_MAX_ATTEMPTS = int(env.get("ANALYSIS_MAX_ATTEMPTS", default=5))
+# Hansen Global Forest Change dataset used for tree cover and loss analysis
+HANSEN_DATASET = env.get(
+    "HANSEN_DATASET", default="UMD/hansen/global_forest_change_2023_v1_11")
+
+# Forest analysis backend, see v1/farms/backends.py
+FOREST_ANALYZER_BACKEND = env.get(
+    "FOREST_ANALYZER_BACKEND", 
+    default="v1.farms.earth_engine.ForestAnalyzer")
+# Directory of the raster tiles read by v1.farms.local_engine
+LOCAL_RASTER_ROOT = env.get(
+    "LOCAL_RASTER_ROOT", default=str(BASE_DIR / "rasters"))
+# Latency in seconds and failure rate of every call of the fake backend, 
+# v1.farms.fake_engine.FakeForestAnalyzer
+FAKE_ANALYZER_LATENCY = float(env.get("FAKE_ANALYZER_LATENCY", default=0))
+FAKE_ANALYZER_FAILURE_RATE = float(
+    env.get("FAKE_ANALYZER_FAILURE_RATE", default=0))
+# GeoJSON extract of the WDPA protected areas, see v1/farms/protected_areas.py
+WDPA_FILE = env.get("WDPA_FILE", default="")
+# Bearer token of the Prometheus scraper, /navigate/metrics/ is disabled 
+# without it, and the port of the Celery worker exporter, see 
+# v1/farms/metrics.py
+METRICS_TOKEN = env.get("METRICS_TOKEN", default="")
+CELERY_METRICS_PORT = int(env.get("CELERY_METRICS_PORT", default=0))
+# Requests slower than SLOW_REQUEST_THRESHOLD milliseconds or running more 
+# than REQUEST_QUERY_THRESHOLD queries are logged as warnings, see 
+# base/middleware.py
+SERVER_TIMING_HEADER = env.get(
+    "SERVER_TIMING_HEADER", default="true").lower() == "true"
+SLOW_REQUEST_THRESHOLD = int(env.get("SLOW_REQUEST_THRESHOLD", default=1000))
+REQUEST_QUERY_THRESHOLD = int(env.get("REQUEST_QUERY_THRESHOLD", default=50))
+# Report snapshots older than REPORT_SNAPSHOT_MAX_AGE seconds are recomputed,
+# see v1/farms/managers.py ReportSnapshotQuerySet
+REPORT_SNAPSHOT_MAX_AGE = int(
+    env.get("REPORT_SNAPSHOT_MAX_AGE", default=60 * 60 * 6))
+# Render the geo_json of the farm list and geo-jsons endpoints from the JSON 
+# text of the column, without decoding it, see base/fields.py RawJSONField
+RAW_GEO_JSON = env.get("RAW_GEO_JSON", default="false").lower() == "true"
+
+
+# Analysis tasks are started when farms are queued, the hourly analysis only
+# sweeps up entries whose dispatch was lost
 CELERY_BEAT_SCHEDULE = {
     "analysis_sync": {
         "task": "daily_analysis_sync",
         "schedule": crontab(minute=0),
-    }
+    },
+    "release_expired_analysis_leases": {
+        "task": "release_expired_analysis_leases",
+        "schedule": crontab(minute="*/5"),
+    },
+}
+# Analysis lanes, run separate workers for them so interactive edits are 
+# never stuck behind bulk imports, e.g. `celery -A navigate worker -Q 
+# analysis_interactive`
+CELERY_TASK_ROUTES = {
+    "daily_analysis_sync": {"queue": "analysis_background"},
+    "interactive_analysis_sync": {"queue": "analysis_interactive"},
 }
 AUTH_TYPE_CLASSES = {
     'external_auth': 'base.authentication.SwitchJWTAuthentication',
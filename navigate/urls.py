@@ -18,10 +18,13 @@ from django.urls import path
 from django.urls import include
 from oauth2_provider import urls as oauth2_urls
 
+from v1.farms.views import metrics_view
+
 urlpatterns = [
     path('navigate/admin/', admin.site.urls),
     path('navigate/farms/', include('v1.farms.urls')),
     path('navigate/supply-chains/', include('v1.supply_chains.urls')),
     path('navigate/dashboard/', include('v1.dashboard.urls')),
     path('navigate/oauth/', include(oauth2_urls)),
+    path('navigate/metrics/', metrics_view),
 ]
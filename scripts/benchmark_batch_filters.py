@@ -0,0 +1,137 @@
+"""
+Benchmark for the batch filters rewritten as semi-joins.
+
+Compares the old ``DISTINCT``-over-join query shapes of ``BatchViewSet.list``
+and ``FarmQuerySet.filter_by_kwargs(batch=...)`` against the ``EXISTS`` /
+``IN`` subqueries that replaced them.
+
+Usage (from ``python manage.py shell``)::
+
+    from scripts import benchmark_batch_filters as bench
+    company = bench.create_batch_farmer_links(total_links=1_000_000)
+    bench.run(company)
+"""
+import random
+import statistics
+import time
+
+from django.apps import apps
+from django.db import connection
+from faker import Faker
+
+faker = Faker()
+
+BULK_SIZE = 10000
+
+
+def create_batch_farmer_links(total_links=1_000_000, batch_count=1000,
+                              farmer_count=100_000):
+    """
+    Creates a company with farmers, farms, batches and batch-farmer links.
+
+    Each batch gets ``total_links / batch_count`` farmers picked at random,
+    so with the defaults a batch holds 1000 farmers and every farmer is in
+    about ten batches.
+
+    Returns:
+        Company: The company owning the generated data.
+    """
+    Company = apps.get_model('supply_chains', 'Company')
+    Farmer = apps.get_model('supply_chains', 'Farmer')
+    Batch = apps.get_model('supply_chains', 'Batch')
+    Farm = apps.get_model('farms', 'Farm')
+
+    company = Company.objects.create(
+        name=f"Benchmark {faker.company()}", state="Western Area",
+        country="Sierra Leone")
+
+    Farmer.objects.bulk_create(
+        (Farmer(name=faker.name(), company=company, state="Western Area",
+                country="Sierra Leone", external_id=str(i))
+         for i in range(farmer_count)),
+        batch_size=BULK_SIZE)
+    farmer_ids = list(Farmer.objects.filter(
+        company=company).values_list('id', flat=True))
+
+    Farm.objects.bulk_create(
+        (Farm(farmer_id=farmer_id, external_id=str(farmer_id.id),
+              state="Western Area", country="Sierra Leone")
+         for farmer_id in farmer_ids),
+        batch_size=BULK_SIZE)
+
+    Batch.objects.bulk_create(
+        Batch(external_id=f"benchmark-{i}") for i in range(batch_count))
+    batch_ids = list(Batch.objects.filter(
+        external_id__startswith="benchmark-").values_list('id', flat=True))
+
+    links_per_batch = total_links // batch_count
+    BatchFarmer = Batch.farmers.through
+    links = []
+    for batch_id in batch_ids:
+        for farmer_id in random.sample(farmer_ids, links_per_batch):
+            links.append(BatchFarmer(batch_id=batch_id, farmer_id=farmer_id))
+        if len(links) >= BULK_SIZE:
+            BatchFarmer.objects.bulk_create(links, ignore_conflicts=True)
+            links = []
+    BatchFarmer.objects.bulk_create(links, ignore_conflicts=True)
+    print(f"Created {BatchFarmer.objects.count()} batch-farmer links")
+    return company
+
+
+def time_queryset(queryset, repeat=5):
+    """
+    Evaluates the queryset ``repeat`` times and returns the median in ms.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        list(queryset.values_list('id', flat=True))
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def explain(queryset):
+    """Returns the ``EXPLAIN ANALYZE`` output of the queryset."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN ANALYZE {sql}", params)
+        return "\n".join(row[0] for row in cursor.fetchall())
+
+
+def run(company, repeat=5, show_plans=False):
+    """
+    Runs the old and new query shapes and prints the median timings.
+
+    Args:
+        company (Company): The company created by
+            ``create_batch_farmer_links``.
+        repeat (int): The number of runs per query.
+        show_plans (bool): Print the ``EXPLAIN ANALYZE`` of each query.
+    """
+    Batch = apps.get_model('supply_chains', 'Batch')
+    Farm = apps.get_model('farms', 'Farm')
+    batch = Batch.objects.filter_by_company(company).first()
+
+    cases = {
+        "batch list (company)": (
+            Batch.objects.filter(farmers__company=company).distinct(),
+            Batch.objects.filter_by_company(company),
+        ),
+        "batch list (country)": (
+            Batch.objects.filter(
+                farmers__farms__country="Sierra Leone").distinct(),
+            Batch.objects.filter_by_kwargs({"country": "Sierra Leone"}),
+        ),
+        "farm list (batch)": (
+            Farm.objects.filter(farmer__batches__id=batch.id).distinct(),
+            Farm.objects.filter_by_kwargs({"batch": batch.id}),
+        ),
+    }
+    for name, (old, new) in cases.items():
+        old_ms = time_queryset(old, repeat)
+        new_ms = time_queryset(new, repeat)
+        print(f"{name}: distinct join {old_ms:.1f} ms, "
+              f"semi-join {new_ms:.1f} ms ({old_ms / new_ms:.1f}x)")
+        if show_plans:
+            print(explain(old))
+            print(explain(new))
@@ -0,0 +1,84 @@
+"""
+Benchmark for the memoized hashid codec and the pre-converted ids.
+
+Compares loading and rendering the ids of a 1000 row response, one primary 
+key and two foreign keys per row, with the plain Hashids codec and Hashid 
+objects rendered through the encoder hook, against the cached codec and ids 
+converted to strings while serializing.
+
+Usage (from ``python manage.py shell``)::
+
+    from scripts import benchmark_hashids as bench
+    bench.run()
+"""
+import json
+import statistics
+import time
+
+from django.conf import settings
+from hashid_field import Hashid
+from hashids import Hashids
+
+from base.hashid import get_hashids
+from base.renderers import HashIDJSONEncoder
+
+ROWS = 1000
+MIN_LENGTH = 7  # The min_length of the id fields
+
+
+def time_call(function, repeat=20):
+    """Calls the function ``repeat`` times and returns the median in ms."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def load_rows(hashids, ids):
+    """Creates the Hashid objects of the rows like the field converters."""
+    def to_hashid(id):
+        return Hashid(
+            id, salt=settings.HASHID_FIELD_SALT, min_length=MIN_LENGTH, 
+            alphabet=settings.HASHID_FIELD_ALPHABET, hashids=hashids)
+
+    return [
+        {
+            "id": to_hashid(id), 
+            "farmer": to_hashid(id // 5), 
+            "creator": to_hashid(1),
+            "name": "Farm",
+        }
+        for id in ids
+    ]
+
+
+def run(rows=ROWS, repeat=20):
+    """
+    Prints the median time to load and to render the ids of ``rows`` rows.
+    """
+    config = (
+        settings.HASHID_FIELD_SALT, MIN_LENGTH, settings.HASHID_FIELD_ALPHABET)
+    plain = Hashids(*config)
+    cached = get_hashids(*config)
+    ids = range(1, rows + 1)
+    load_rows(cached, ids)
+
+    plain_ms = time_call(lambda: load_rows(plain, ids), repeat)
+    cached_ms = time_call(lambda: load_rows(cached, ids), repeat)
+    print(f"load {rows} rows: plain {plain_ms:.1f} ms, "
+          f"cached {cached_ms:.1f} ms ({plain_ms / cached_ms:.1f}x)")
+
+    objects = load_rows(cached, ids)
+    strings = [
+        {key: str(value) if isinstance(value, Hashid) else value 
+         for key, value in row.items()}
+        for row in objects
+    ]
+    hook_ms = time_call(
+        lambda: json.dumps(objects, cls=HashIDJSONEncoder), repeat)
+    string_ms = time_call(
+        lambda: json.dumps(strings, cls=HashIDJSONEncoder), repeat)
+    print(f"render {rows} rows: encoder hook {hook_ms:.1f} ms, "
+          f"pre-converted {string_ms:.1f} ms ({hook_ms / string_ms:.1f}x)")
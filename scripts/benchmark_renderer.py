@@ -0,0 +1,98 @@
+"""
+Benchmark for the orjson response renderer.
+
+Compares rendering a farm list of 1000 rows, each with a 200 vertex polygon,
+decimals, dates and a Hashid, with DRF's JSONRenderer and the
+HashIDJSONEncoder against the orjson based HashIDRenderer.
+
+Usage (from ``python manage.py shell``)::
+
+    from scripts import benchmark_renderer as bench
+    bench.run()
+"""
+import datetime
+import decimal
+import json
+import math
+import statistics
+import time
+
+from django.conf import settings
+from hashid_field import Hashid
+from rest_framework.renderers import JSONRenderer
+
+from base.hashid import get_hashids
+from base.renderers import HashIDJSONEncoder, HashIDRenderer
+
+ROWS = 1000
+VERTICES = 200
+MIN_LENGTH = 7  # The min_length of the id fields
+
+
+class Response:
+    """The part of the response used by the renderers."""
+    status_code = 200
+
+
+class StdlibRenderer(JSONRenderer):
+    """The previous renderer, DRF's JSONRenderer with the Hashid encoder."""
+    encoder_class = HashIDJSONEncoder
+
+
+def time_call(function, repeat=10):
+    """Calls the function ``repeat`` times and returns the median in ms."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def make_rows(rows, vertices):
+    """Creates farm list rows like the FarmSerializer."""
+    config = (
+        settings.HASHID_FIELD_SALT, MIN_LENGTH, settings.HASHID_FIELD_ALPHABET)
+    hashids = get_hashids(*config)
+    # DRF truncates the microseconds, orjson keeps them
+    now = datetime.datetime(2024, 1, 1, 12, tzinfo=datetime.timezone.utc)
+    data = []
+    for id in range(1, rows + 1):
+        ring = [
+            [
+                round(-5 + math.cos(2 * math.pi * index / vertices) / 100, 6),
+                round(7 + math.sin(2 * math.pi * index / vertices) / 100, 6),
+            ]
+            for index in range(vertices)
+        ]
+        data.append({
+            "id": Hashid(
+                id, salt=config[0], min_length=MIN_LENGTH,
+                alphabet=config[2], hashids=hashids),
+            "name": f"Farm {id}",
+            "area": decimal.Decimal("12.3456"),
+            "created_on": now,
+            "geo_json": {"type": "Polygon", "coordinates": [ring + ring[:1]]},
+        })
+    return data
+
+
+def run(rows=ROWS, vertices=VERTICES, repeat=10):
+    """
+    Prints the median time to render ``rows`` farms with both renderers.
+    """
+    data = make_rows(rows, vertices)
+    context = {"response": Response()}
+    stdlib = StdlibRenderer()
+    renderer = HashIDRenderer()
+    envelope = {"success": True, "errors": [], "code": 200, "data": data}
+    assert (
+        json.loads(renderer.render(data, renderer_context=context))["data"]
+        == json.loads(stdlib.render(envelope))["data"])
+
+    stdlib_ms = time_call(lambda: stdlib.render(envelope), repeat)
+    orjson_ms = time_call(
+        lambda: renderer.render(data, renderer_context=context), repeat)
+    print(f"render {rows} farms of {vertices} vertices: "
+          f"stdlib {stdlib_ms:.1f} ms, orjson {orjson_ms:.1f} ms "
+          f"({stdlib_ms / orjson_ms:.1f}x)")
@@ -7,6 +7,7 @@ from django.conf import settings
 from django.apps import apps
 
 from v1.farms.constants import Pillers
+from v1.farms.tasks import LOSS_ANALYSES
 
 
 COMPANY_ID = "VkDVYQe"
@@ -80,95 +81,20 @@ def create_batch():
     }
     return BatchModel.objects.create(**data)
 
-def create_deforestation_summery(farm):
-    DeforestationSummaryModel = apps.get_model(
-        'farms', 'DeforestationSummary')
-    data = [
-                {
-                    "farm": farm,
-                    "name": "Tree cover loss events",
-                    "year": faker.random_int(2014, 2024),
-                    "canopy_density": faker.random_int(10, 100),
-                    "source": faker.company(),
-                    "value": 1
-                },
-                {
-                    "farm": farm,
-                    "name": "Tree cover loss events",
-                    "year": faker.random_int(2014, 2024),
-                    "canopy_density": faker.random_int(10, 100),
-                    "source": faker.company(),
-                    "value": 1
-                },
-                {
-                    "farm": farm,
-                    "name": "Tree cover loss events",
-                    "year": faker.random_int(2014, 2024),
-                    "canopy_density": faker.random_int(10, 100),
-                    "source": faker.company(),
-                    "value": 1
-                },
-                {
-                    "farm": farm,
-                    "name": "Tree cover loss area",
-                    "year": faker.random_int(2014, 2024),
-                    "canopy_density": faker.random_int(10, 100),
-                    "source": faker.company(),
-                    "value": 0.5329 
-                },
-                {
-                    "farm": farm,
-                    "name": "Tree cover loss area",
-                    "year": faker.random_int(2014, 2024),
-                    "canopy_density": faker.random_int(10, 100),
-                    "source": faker.company(),
-                    "value": 0.5329 
-                },
-                {
-                    "farm": farm,
-                    "name": "Tree cover loss area",
-                    "year": faker.random_int(2014, 2024),
-                    "canopy_density": faker.random_int(10, 100),
-                    "source": faker.company(),
-                    "value": 0.5329 
-                },
-                {
-                    "farm": farm,
-                    "name": "Forest loss in protected area event",
-                    "year": faker.random_int(2014, 2024),
-                    "canopy_density": faker.random_int(10, 100),
-                    "source": faker.company(),
-                    "value": 1
-                },
-                {
-                    "farm": farm,
-                    "name": "Forest loss in protected area event",
-                    "year": faker.random_int(2014, 2024),
-                    "canopy_density": faker.random_int(10, 100),
-                    "source": faker.company(),
-                    "value": 1
-                },
-                {
-                    "farm": farm,
-                    "name": "Forest loss in protected area event",
-                    "year": faker.random_int(2014, 2024),
-                    "canopy_density": faker.random_int(10, 100),
-                    "source": faker.company(),
-                    "value": 1
-                },
-                {
-                    "farm": farm,
-                    "name": "Forest loss in protected area event",
-                    "year": faker.random_int(2014, 2024),
-                    "canopy_density": faker.random_int(10, 100),
-                    "source": faker.company(),
-                    "value": 1
-                },
-            ]
-    summary = []
-    for i in data:
-        summary.append(DeforestationSummaryModel(**i))
-    return DeforestationSummaryModel.objects.bulk_create(summary)
+def create_yearly_tree_cover_loss(farm):
+    YearlyTreeCoverLossModel = apps.get_model('farms', 'YearlyTreeCoverLoss')
+    losses = []
+    for canopy_density, radius in LOSS_ANALYSES:
+        for year in faker.random_elements(
+                range(2015, 2024), length=3, unique=True):
+            losses.append(YearlyTreeCoverLossModel(
+                farm=farm,
+                year=year,
+                canopy_density=canopy_density,
+                radius=radius,
+                value=faker.pyfloat(min_value=0.01, max_value=0.5)
+            ))
+    return YearlyTreeCoverLossModel.objects.bulk_create(losses)
 
 def load_tradin_data():
     company = get_company()
@@ -182,7 +108,7 @@ def load_tradin_data():
         farm = create_farm(farmer, obj)
         create_farm_properties(farm)
         create_farm_comment(farm)
-        create_deforestation_summery(farm)
+        create_yearly_tree_cover_loss(farm)
         batch.farmers.add(farmer)
     print("Data loaded successfully")
 
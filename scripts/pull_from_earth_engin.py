@@ -29,8 +29,7 @@ class ForestAnalyzer():
     buffer_area = 0
     canopy_dens = 30
     _buffer_poly = None
-    dataset_tree_cover = ee.Image(
-        "UMD/hansen/global_forest_change_2023_v1_11")
+    dataset_tree_cover = ee.Image(settings.HANSEN_DATASET)
     dataset_primary_forest = ee.ImageCollection(
         "UMD/GLAD/PRIMARY_HUMID_TROPICAL_FORESTS/v1").mosaic().selfMask()
     dataset_protected_areas = ee.FeatureCollection(
@@ -53,7 +52,7 @@ class ForestAnalyzer():
 
         if geo_json["type"] == "Point":
             geo_json = coord_to_poly(
-                geo_json['coordinates'][0], geo_json['coordinates'][1])
+                geo_json['coordinates'][1], geo_json['coordinates'][0])
             
         self.polygon = ee.Geometry.Polygon(geo_json["coordinates"][0])
         self.buffer_area = buffer_area
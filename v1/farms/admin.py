@@ -4,6 +4,7 @@ from .models import Farm
 from .models import FarmProperty
 from .models import FarmComment
 from .models import YearlyTreeCoverLoss
+from .models import ReportSnapshot
 
 @admin.register(Farm)
 class FarmAdmin(admin.ModelAdmin):
@@ -38,4 +39,14 @@ class YearlyTreeCoverLossAdmin(admin.ModelAdmin):
     """
 
     list_display = ['farm', 'canopy_density', 'year', 'value']
-    list_filter = ['canopy_density']
\ No newline at end of file
+    list_filter = ['canopy_density']
+
+@admin.register(ReportSnapshot)
+class ReportSnapshotAdmin(admin.ModelAdmin):
+    """
+    Admin class for managing the ReportSnapshot model in the Django admin 
+    interface.
+    """
+
+    list_display = ['company', 'piller', 'filters', 'generated_on']
+    list_filter = ['piller', 'company']
@@ -0,0 +1,306 @@
+import json
+import threading
+from contextlib import contextmanager
+from importlib import import_module
+
+import numpy as np
+import shapely
+from django.conf import settings
+from shapely.geometry import shape
+
+from .constants import BUFFER_RADII, PROTECTED_AREA_RADIUS
+from .metrics import timed_analyzer_method
+from .protected_areas import are_near_protected_areas
+from .protected_areas import calculate_protected_areas
+from .protected_areas import get_protected_areas
+from .utils import HexagonUtils, buffer_geometries, calculate_area
+
+# Buffered polygons of the current batch of farms, see BaseForestAnalyzer.batch
+_batch_buffers = threading.local()
+
+
+class TransientAnalysisError(Exception):
+    """
+    Raised by a backend when an analysis failed for a temporary reason, e.g.
+    a rate limit or an unavailable service, and can be retried later.
+    """
+
+
+def get_geometry_key(geo_json):
+    """
+    Returns a key identifying a geojson geometry by its coordinates.
+    """
+    return json.dumps(geo_json["coordinates"])
+
+
+class BaseForestAnalyzer:
+    """
+    Interface of the forest analysis backends.
+
+    A backend computes the forest metrics of one farm polygon. The Earth
+    Engine backend (`v1.farms.earth_engine.ForestAnalyzer`) runs them as
+    Earth Engine reductions, the local backend
+    (`v1.farms.local_engine.LocalForestAnalyzer`) reads the same datasets
+    from local raster tiles.
+
+    Attributes:
+        geo_json (dict): The geojson geometry of the farm, with points and
+            one-vertex polygons converted to hexagons.
+        buffer_area (int): The buffer area around the polygon.
+        canopy_dens (int): The canopy density threshold.
+        dataset (str): The id of the Hansen Global Forest Change dataset.
+    """
+
+    geo_json = None
+    buffer_area = 0
+    canopy_dens = 30
+    dataset = None
+
+    # Methods whose duration is recorded per backend, see v1/farms/metrics.py
+    TIMED_METHODS = (
+        "calculate_tree_cover", "calculate_primary_forest", 
+        "calculate_protected_area", "is_near_protected_area",
+        "calculate_yearly_tree_cover_loss",
+    )
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        Records the duration of the analysis methods of every backend, 
+        inherited ones included, labelled with the backend name.
+        """
+        super().__init_subclass__(**kwargs)
+        for name in cls.TIMED_METHODS:
+            method = getattr(cls, name)
+            method = getattr(method, "__wrapped__", method)
+            setattr(cls, name, timed_analyzer_method(cls.__name__, method))
+
+    def __init__(self, geo_json, buffer_area=0, canopy_dens=30,
+                 dataset=None):
+        """
+        Constructor for the analyzer.
+
+        Args:
+            geo_json (dict): The geojson data of the polygon.
+            buffer_area (int): The buffer area around the polygon.
+            canopy_dens (int): The canopy density threshold.
+            dataset (str): The id of the Hansen Global Forest Change
+                dataset, defaults to settings.HANSEN_DATASET.
+        """
+        self.geo_json = self.to_polygon_geo_json(geo_json)
+        self.buffer_area = buffer_area
+        self.canopy_dens = canopy_dens
+        self.dataset = dataset or settings.HANSEN_DATASET
+
+    def calculate_tree_cover(self) -> float:
+        """
+        Returns the tree cover area in hectares within the polygon.
+        """
+        raise NotImplementedError
+
+    def calculate_primary_forest(self) -> float:
+        """
+        Returns the primary forest area in hectares within the polygon.
+        """
+        raise NotImplementedError
+
+    def get_buffered_geo_json(self, distance=0):
+        """
+        Returns the polygon buffered by the buffer area and a distance.
+
+        Inside `batch`, the polygons buffered for the whole batch are 
+        reused.
+
+        Args:
+            distance (float): A distance in meters added to the buffer 
+                area.
+
+        Returns:
+            dict: The geojson polygon.
+        """
+        distance = (self.buffer_area or 0) + distance
+        if not distance:
+            return self.geo_json
+        polygons = getattr(_batch_buffers, "polygons", None) or {}
+        buffered = polygons.get((get_geometry_key(self.geo_json), distance))
+        return buffered or self.buffer_geo_jsons([self.geo_json], distance)[0]
+
+    def calculate_protected_area(self):
+        """
+        Returns the protected area within the polygon in square kilometers.
+
+        The default computes the intersection with the protected areas of 
+        the local WDPA extract in settings.WDPA_FILE.
+
+        Returns:
+            float: The protected area, or None if no extract is configured.
+        """
+        if not get_protected_areas():
+            return None
+        return float(calculate_protected_areas(
+            [self.get_buffered_geo_json()])[0])
+
+    def is_near_protected_area(self, distance=PROTECTED_AREA_RADIUS):
+        """
+        Returns True if a protected area is within a distance of the 
+        polygon.
+
+        The default checks the protected areas of the local WDPA extract in
+        settings.WDPA_FILE.
+
+        Args:
+            distance (float): The distance in meters.
+
+        Returns:
+            bool: The result, or None if no extract is configured.
+        """
+        if not get_protected_areas():
+            return None
+        return bool(are_near_protected_areas(
+            [self.get_buffered_geo_json()], distance)[0])
+
+    def calculate_yearly_tree_cover_loss(self) -> dict:
+        """
+        Returns the tree cover loss in hectares keyed by year, e.g.
+        {"2021": 0.12}.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def get_batch_key(cls, geo_json):
+        """
+        Returns the key of the batch the farm is analysed in.
+
+        Farms with the same key are analysed one after the other inside
+        `batch`, so a backend can share work between them. The default is
+        a single batch.
+
+        Args:
+            geo_json (dict): The geojson geometry of the farm.
+
+        Returns:
+            str: The batch key.
+        """
+        return ""
+
+    @classmethod
+    @contextmanager
+    def batch(cls, geo_jsons, dataset=None):
+        """
+        Context in which the analyzers of a batch of farms are created.
+
+        The polygons of the batch are buffered by every radius in 
+        BUFFER_RADII up front, with one vectorized buffer call per radius, 
+        and the analyzers of the batch reuse them. Backends extend this to 
+        load other data shared by the farms once.
+
+        Args:
+            geo_jsons (list): The geojson geometries of the farms.
+            dataset (str): The id of the Hansen Global Forest Change
+                dataset, defaults to settings.HANSEN_DATASET.
+        """
+        polygons = []
+        for geo_json in geo_jsons:
+            try:
+                polygons.append(cls.to_polygon_geo_json(geo_json))
+            except ValueError:
+                # Unsupported geometries fail in their own analysis
+                continue
+        _batch_buffers.polygons = {}
+        keys = [get_geometry_key(polygon) for polygon in polygons]
+        for radius in BUFFER_RADII if polygons else ():
+            buffered = cls.buffer_geo_jsons(polygons, radius)
+            _batch_buffers.polygons.update(
+                ((key, radius), polygon) 
+                for key, polygon in zip(keys, buffered))
+        try:
+            yield
+        finally:
+            _batch_buffers.polygons = {}
+
+    @classmethod
+    def buffer_geo_jsons(cls, geo_jsons, distance):
+        """
+        Buffers many farm polygons by a distance in meters at once.
+
+        Args:
+            geo_jsons (list): The geojson geometries of the farms.
+            distance (float): The buffer distance in meters.
+
+        Returns:
+            list: The buffered geojson polygons.
+        """
+        geometries = np.array([
+            shape(cls.to_polygon_geo_json(geo_json)) for geo_json in geo_jsons
+        ])
+        return [
+            json.loads(geo_json) for geo_json in shapely.to_geojson(
+                buffer_geometries(geometries, distance))
+        ]
+
+    @classmethod
+    def to_polygon_geo_json(cls, geo_json):
+        """
+        Returns the geometry of the farm as a geojson polygon.
+
+        Points and one-vertex polygons are converted to a hexagon around the
+        coordinate.
+
+        Args:
+            geo_json (dict): The geojson geometry of the farm.
+
+        Returns:
+            dict: The geojson polygon.
+
+        Raises:
+            ValueError: If the geometry is not a Point or a Polygon.
+        """
+        if geo_json["type"] == "Point":
+            #converting point to polygon while analysing, geojson
+            #coordinates are in [longitude, latitude] order
+            return HexagonUtils().coord_to_poly(
+                latitude=geo_json["coordinates"][1],
+                longitude=geo_json["coordinates"][0])
+        elif geo_json["type"] == "Polygon":
+            #handling incorrect polygon
+            return cls.handle_incorrect_polygon(geo_json)
+        raise ValueError(
+            "Invalid geojson data, Only Point and Polygon are supported.")
+
+    @staticmethod
+    def handle_incorrect_polygon(geo_json):
+        #handling type polygon having only 1 coordinate which are uploaded
+        #via bulk upload
+        if geo_json["type"] == "Polygon" and len(
+            geo_json["coordinates"][0]) == 1:
+            geo_json = HexagonUtils().coord_to_poly(
+                latitude=geo_json["coordinates"][0][0][1],
+                longitude=geo_json["coordinates"][0][0][0]
+            )
+        return geo_json
+
+    def calculate_area(self, geo_json):
+        """
+        Returns the geodesic area of the polygon in hectares.
+
+        Args:
+            geo_json (dict): The geojson geometry of the farm.
+
+        Returns:
+            float: The area in hectares.
+        """
+        #handling incorrect polygon
+        geo_json = self.handle_incorrect_polygon(geo_json)
+        return calculate_area(geo_json)
+
+
+def get_analyzer_class():
+    """
+    Returns the forest analyzer class configured in
+    settings.FOREST_ANALYZER_BACKEND.
+
+    Returns:
+        Type[BaseForestAnalyzer]: The analyzer class.
+    """
+    module_path, class_name = settings.FOREST_ANALYZER_BACKEND.rsplit(".", 1)
+    module = import_module(module_path)
+    return getattr(module, class_name)
@@ -17,4 +17,33 @@ class TreeCoverLossStandard(models.TextChoices):
     RAINFOREST_ALLIANCE = 'RAINFOREST_ALLIANCE', 'Rainforest Alliance'
     FAIRTRADE = 'FAIRTRADE', 'Fairtrade'
     EUDR = 'EUDR', 'EUDR'
-    
+
+
+# Radius in meters around the farm within which the tree cover loss is 
+# evaluated for each standard. The loss of the farm polygon itself is always
+# computed as well, with a radius of 0.
+TREE_COVER_LOSS_RADII = {
+    TreeCoverLossStandard.RAINFOREST_ALLIANCE: 113,
+    TreeCoverLossStandard.FAIRTRADE: 113,
+    TreeCoverLossStandard.EUDR: 113,
+}
+
+
+# Query parameters of the farm filters that define a report snapshot.
+REPORT_FILTERS = ('country', 'state', 'farmer', 'supply_chain', 'batch')
+
+# Default number of rows in a page of the analysis detail table.
+DETAIL_PAGE_SIZE = 100
+
+# The Hansen dataset used for all results computed before the dataset 
+# version was recorded.
+HANSEN_LEGACY_DATASET = "UMD/hansen/global_forest_change_2023_v1_11"
+
+# Distance in meters around a farm within which a protected area counts as 
+# near the farm.
+PROTECTED_AREA_RADIUS = 2000
+
+# Buffer distances the analysis needs around each farm, buffered in bulk for
+# every batch of farms.
+BUFFER_RADII = tuple(sorted(
+    {*TREE_COVER_LOSS_RADII.values(), PROTECTED_AREA_RADIUS} - {0}))
@@ -1,21 +1,114 @@
+import random
+import re
+import time
+
 import ee
 from django.conf import settings
 from sentry_sdk import capture_exception
-from shapely.geometry import shape
-from shapely.ops import transform
-from pyproj import Transformer
-from .utils import HexagonUtils
 
-# Define the polygon coordinates for the analysis
+from base.rate_limit import TokenBucket
+from . import metrics
+from .backends import BaseForestAnalyzer, TransientAnalysisError
+from .constants import PROTECTED_AREA_RADIUS
+from .protected_areas import get_protected_areas
+
+# HTTP statuses of Earth Engine errors worth retrying
+TRANSIENT_STATUSES = (429, 500, 502, 503, 504)
+# HTTP status in the message of an Earth Engine error, e.g. '<HttpError 503'
+TRANSIENT_STATUS_PATTERN = re.compile(r"(?:error|status|code)\W*(\d{3})\b")
+# Messages of Earth Engine errors worth retrying, lower case
+TRANSIENT_MESSAGES = (
+    "too many requests", "too many concurrent", "quota", "rate limit", 
+    "internal error", "service unavailable", "backend error", 
+    "deadline exceeded", "timed out", "computation timed out",
+)
+
+
+def initialize_earth_engine():
+    """
+    Initializes the Earth Engine client with the service account.
+    """
+    credentials = ee.ServiceAccountCredentials(
+        settings.EE_SERVICE_ACCOUNT, 
+        settings.EE_SERVICE_ACCOUNT_CREDENTIAL_PATH)
+    ee.Initialize(credentials)
 
 
-class ForestAnalyzer():
+def is_transient_error(error):
+    """
+    Checks if an Earth Engine error is temporary.
+
+    Rate limit (429) and server (5xx) errors, and connection errors, are 
+    temporary. Errors of the request itself, e.g. an invalid geometry, are 
+    not. The HTTP status of the error decides when it is known, the 
+    message only when it has none, so a 400 mentioning a quota is not 
+    retried.
+
+    Args:
+        error (Exception): The error.
+
+    Returns:
+        bool: True if the request can be retried.
+    """
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    status = getattr(getattr(error, "resp", None), "status", None)
+    if status is not None:
+        return int(status) in TRANSIENT_STATUSES
+    message = str(error).lower()
+    match = TRANSIENT_STATUS_PATTERN.search(message)
+    if match:
+        return int(match.group(1)) in TRANSIENT_STATUSES
+    return any(text in message for text in TRANSIENT_MESSAGES)
+
+
+def get_info(computed_object):
+    """
+    Runs `getInfo()` on an Earth Engine object under the shared rate limit.
+
+    Every request takes a token from a Redis token bucket shared by all 
+    workers, refilled at settings.EE_REQUESTS_PER_SECOND, so the workers 
+    together stay at the quota. Temporary errors are retried with an 
+    exponential backoff with jitter.
+
+    Args:
+        computed_object (ee.ComputedObject): The object to compute.
+
+    Returns:
+        The computed value.
+
+    Raises:
+        TransientAnalysisError: If a temporary error persisted after 
+            settings.EE_MAX_RETRIES retries.
+    """
+    rate_limiter = TokenBucket(
+        "earth-engine", settings.EE_REQUESTS_PER_SECOND, 
+        settings.EE_REQUEST_BURST)
+    for attempt in range(settings.EE_MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        try:
+            with metrics.EE_REQUEST_SECONDS.time():
+                return computed_object.getInfo()
+        except Exception as e:
+            if not is_transient_error(e):
+                metrics.EE_ERRORS.labels("permanent").inc()
+                raise
+            metrics.EE_ERRORS.labels("transient").inc()
+            if attempt == settings.EE_MAX_RETRIES:
+                raise TransientAnalysisError(str(e)) from e
+            backoff = min(
+                settings.EE_BACKOFF_MAX, settings.EE_BACKOFF_BASE * 2 ** attempt)
+            time.sleep(backoff * random.uniform(0.5, 1))
+
+
+class ForestAnalyzer(BaseForestAnalyzer):
     """
     Wrapper class to do the forest analysis using Earth Engine.
     Attributes:
         polygon (ee.Geometry): The polygon to analyze.
         buffer_area (int): The buffer area around the polygon.
         canopy_dens (int): The canopy density threshold.
+        dataset (str): The id of the Hansen Global Forest Change dataset.
         dataset_tree_cover (ee.Image): The tree cover data set.
         dataset_primary_forest (ee.ImageCollection):
             The primary forest data set.
@@ -29,7 +122,8 @@ class ForestAnalyzer():
     _buffer_poly = None
 
 
-    def __init__(self, geo_json, buffer_area=0, canopy_dens=30):
+    def __init__(self, geo_json, buffer_area=0, canopy_dens=30, 
+                 dataset=None):
         """
         Constructor for the ForestAnalyzer class.
 
@@ -41,35 +135,25 @@ class ForestAnalyzer():
             geo_json (dict): The geojson data of the polygon.
             buffer_area (int): The buffer area around the polygon.
             canopy_dens (int): The canopy density threshold.
+            dataset (str): The id of the Hansen Global Forest Change 
+                dataset, defaults to settings.HANSEN_DATASET.
 
         """
 
-        credentials = ee.ServiceAccountCredentials(settings.EE_SERVICE_ACCOUNT, settings.EE_SERVICE_ACCOUNT_CREDENTIAL_PATH)
-        ee.Initialize(credentials)
-        self.dataset_tree_cover = ee.Image(
-        "UMD/hansen/global_forest_change_2023_v1_11")
+        super().__init__(geo_json, buffer_area, canopy_dens, dataset)
+        initialize_earth_engine()
+        self.dataset_tree_cover = ee.Image(self.dataset)
         self.dataset_primary_forest = ee.ImageCollection(
             "UMD/GLAD/PRIMARY_HUMID_TROPICAL_FORESTS/v1").mosaic().selfMask()
         self.dataset_protected_areas = ee.FeatureCollection(
             "WCMC/WDPA/current/polygons")
 
-        if geo_json["type"] == "Point":
-            #converting point to polygon while analysing
-            geo_geometry = HexagonUtils().coord_to_poly(
-                geo_json["coordinates"][0], geo_json["coordinates"][1])
-            self.polygon = ee.Geometry.Polygon(geo_geometry["coordinates"][0])
-        elif geo_json["type"] == "Polygon":
-            #handling incorrect polygon
-            geo_json = self.handle_incorrect_polygon(geo_json)
-            self.polygon = ee.Geometry.Polygon(geo_json["coordinates"][0])
-        else:
-            raise ValueError(
-                "Invalid geojson data, Only Point and Polygon are supported.")
-        self.buffer_area = buffer_area
-        self.canopy_dens = canopy_dens
+        self.polygon = ee.Geometry.Polygon(self.geo_json["coordinates"][0])
         self._buffer_poly = self.polygon
         if buffer_area:
-            self._buffer_poly = self.polygon.buffer(buffer_area)
+            # Buffered locally, in bulk for the farms of a batch
+            self._buffer_poly = ee.Geometry.Polygon(
+                self.get_buffered_geo_json()["coordinates"])
 
     def calculate_tree_cover(self) -> float:
         """
@@ -95,9 +179,9 @@ class ForestAnalyzer():
         pixel_area = ee.Image.pixelArea()
         tree_cover_pixel_area = tree_cover_extent.multiply(pixel_area)
 
-        tree_cover_total_area = tree_cover_pixel_area.reduceRegion(
+        tree_cover_total_area = get_info(tree_cover_pixel_area.reduceRegion(
             reducer=ee.Reducer.sum(), geometry=self._buffer_poly,
-            scale=30, maxPixels=1e9).getInfo()
+            scale=30, maxPixels=1e9))
         tree_cover_area_ha = tree_cover_total_area['treecover2000'] / 10000
 
         return tree_cover_area_ha
@@ -118,12 +202,12 @@ class ForestAnalyzer():
 
         primary_forest_pixel_area = primary_forest_extent.multiply(
             ee.Image.pixelArea())
-        primary_forest_area = primary_forest_pixel_area.reduceRegion(
+        primary_forest_area = get_info(primary_forest_pixel_area.reduceRegion(
             reducer=ee.Reducer.sum(),
             geometry=self._buffer_poly,
             scale=30,
             maxPixels=1e9
-        ).getInfo()['Primary_HT_forests']
+        ))['Primary_HT_forests']
 
         primary_forest_area_ha = primary_forest_area / 10000
 
@@ -133,11 +217,12 @@ class ForestAnalyzer():
         """
         Calculates the total protected area within a specified polygon.
 
-        This function loads the 'WCMC/WDPA/current/polygons' dataset,
-        which contains protected area information. It then filters these
-        areas to find those that intersect with the specified polygon,
-        defined by the 'polygon_coords' parameter. The function calculates
-        the total area of these intersecting protected areas in square
+        When a local WDPA extract is configured in settings.WDPA_FILE, the 
+        area is computed from its spatial index without an Earth Engine 
+        call. Otherwise this function loads the 
+        'WCMC/WDPA/current/polygons' dataset, which contains protected area
+        information, filters the areas intersecting the polygon and sums 
+        the area of their intersection with the polygon in square 
         kilometers.
 
         Returns:
@@ -145,15 +230,39 @@ class ForestAnalyzer():
                 the specified polygon in square kilometers.
 
         """
+        if get_protected_areas():
+            return super().calculate_protected_area()
+
         intersecting_areas = self.dataset_protected_areas.filterBounds(
             self._buffer_poly)
 
         area_calculator = intersecting_areas.map(
             lambda feature: feature.set(
-                'area', feature.geometry().area().divide(1e6)))
+                'area', feature.geometry().intersection(
+                    self._buffer_poly, maxError=1).area().divide(1e6)))
 
         total_area = area_calculator.aggregate_sum('area')
-        return total_area.getInfo()
+        return get_info(total_area)
+
+    def is_near_protected_area(self, distance=PROTECTED_AREA_RADIUS):
+        """
+        Checks if a protected area is within a distance of the polygon.
+
+        Uses the local WDPA extract when settings.WDPA_FILE is configured, 
+        and the 'WCMC/WDPA/current/polygons' dataset otherwise.
+
+        Args:
+            distance (float): The distance in meters.
+
+        Returns:
+            bool: True if a protected area is within the distance.
+        """
+        if get_protected_areas():
+            return super().is_near_protected_area(distance)
+        nearby_areas = self.dataset_protected_areas.filterBounds(
+            ee.Geometry.Polygon(
+                self.get_buffered_geo_json(distance)["coordinates"]))
+        return get_info(nearby_areas.size()) > 0
 
     def calculate_yearly_tree_cover_loss(self):
         """
@@ -191,7 +300,7 @@ class ForestAnalyzer():
             scale=30,
             maxPixels=1e9
         )
-        return self._format_yearly_data(yearly_loss_area.getInfo())
+        return self._format_yearly_data(get_info(yearly_loss_area))
 
     @staticmethod
     def _format_yearly_data(data: dict) -> dict:
@@ -215,37 +324,74 @@ class ForestAnalyzer():
             formatted_data[f"20{year:02d}"] = loss_sum
         return formatted_data
     
-    @staticmethod
-    def handle_incorrect_polygon(geo_json):
-        #handling type polygon having only 1 coordinate which are uploaded
-        #via bulk upload
-        if geo_json["type"] == "Polygon" and len(
-            geo_json["coordinates"][0]) == 1:
-            geo_json = HexagonUtils().coord_to_poly(
-                geo_json["coordinates"][0][0][0], 
-                geo_json["coordinates"][0][0][1]
-            )
-        return geo_json
-
-    def calculate_area(self, geo_json):
-        # Define a transformer to convert from WGS84 (lat/lon) to a
-        # projected coordinate system (e.g., UTM)
-        # Use an appropriate UTM zone for the region. For example,
-        # EPSG:32648 is for UTM zone 48N.
-
-        #handling incorrect polygon
-        geo_json = self.handle_incorrect_polygon(geo_json)
-
-        polygon = shape(geo_json)
-        transformer = Transformer.from_crs(
-            "epsg:4326", "epsg:32648", always_xy=True)
-
-        # Transform the polygon to the projected coordinate system (e.g., UTM)
-        projected_polygon = transform(transformer.transform, polygon)
-
-        # Calculate the area in square meters
-        area_sqm = projected_polygon.area
-
-        # Convert square meters to hectares (1 hectare = 10,000 square meters)
-        area_ha = area_sqm / 10000
-        return area_ha
\ No newline at end of file
+    @classmethod
+    def get_ee_polygon(cls, geo_json):
+        """
+        Converts the geojson geometry of a farm to an Earth Engine polygon.
+
+        Args:
+            geo_json (dict): The geojson geometry of the farm.
+
+        Returns:
+            ee.Geometry: The polygon.
+        """
+        geo_json = cls.to_polygon_geo_json(geo_json)
+        return ee.Geometry.Polygon(geo_json["coordinates"][0])
+
+
+def calculate_loss_years_batch(geo_jsons, years, canopy_densities=(10, 30),
+                               dataset=None):
+    """
+    Calculates the tree cover loss of the given years for many farms.
+
+    Every (canopy density, year) pair is a band of one image, which is 
+    reduced over a feature collection of all the farms in a single 
+    `reduceRegions` call, instead of one `reduceRegion` call per farm.
+
+    Args:
+        geo_jsons (dict): The geojson geometries of the farms keyed by farm 
+            id.
+        years (list): The loss years to calculate, e.g. [2024].
+        canopy_densities (tuple): The canopy density thresholds.
+        dataset (str): The id of the Hansen Global Forest Change dataset, 
+            defaults to settings.HANSEN_DATASET.
+
+    Returns:
+        dict: The loss area in hectares keyed by farm id, canopy density and
+            year, e.g. {farm_id: {30: {2024: 0.12}}}.
+    """
+    initialize_earth_engine()
+    dataset_tree_cover = ee.Image(dataset or settings.HANSEN_DATASET)
+    loss = dataset_tree_cover.select("loss")
+    tree_cover = dataset_tree_cover.select("treecover2000")
+    loss_year = dataset_tree_cover.select("lossyear")
+    pixel_area = ee.Image.pixelArea().divide(10000)
+
+    bands = []
+    for canopy_dens in canopy_densities:
+        for year in years:
+            band = loss.updateMask(tree_cover.gte(canopy_dens)).updateMask(
+                loss_year.eq(year - 2000)).multiply(pixel_area).rename(
+                    f"loss_{canopy_dens}_{year}")
+            bands.append(band)
+    image = ee.Image.cat(bands)
+
+    features = ee.FeatureCollection([
+        ee.Feature(ForestAnalyzer.get_ee_polygon(geo_json), 
+                   {"farm_id": str(farm_id)})
+        for farm_id, geo_json in geo_jsons.items()
+    ])
+    result = get_info(image.reduceRegions(
+        collection=features, reducer=ee.Reducer.sum(), scale=30
+    ))
+
+    data = {}
+    for feature in result["features"]:
+        properties = feature["properties"]
+        data[properties["farm_id"]] = {
+            canopy_dens: {
+                year: properties.get(f"loss_{canopy_dens}_{year}") or 0
+                for year in years
+            } for canopy_dens in canopy_densities
+        }
+    return data
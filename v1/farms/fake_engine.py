@@ -0,0 +1,102 @@
+"""
+Stand-in for the Earth Engine backend, for offline tests and benchmarks.
+
+The results are derived from a hash of the geometry, so the same farm always
+gets the same numbers, and every call waits settings.FAKE_ANALYZER_LATENCY
+seconds and fails with settings.FAKE_ANALYZER_FAILURE_RATE probability, to
+mimic the latency and the temporary errors of Earth Engine.
+"""
+import hashlib
+import random
+import time
+
+from django.conf import settings
+
+from .backends import BaseForestAnalyzer, TransientAnalysisError
+from .backends import get_geometry_key
+from .utils import get_dataset_loss_year
+
+FIRST_LOSS_YEAR = 2001
+
+
+class FakeForestAnalyzer(BaseForestAnalyzer):
+    """
+    Deterministic fake of `v1.farms.earth_engine.ForestAnalyzer`.
+
+    Select it with FOREST_ANALYZER_BACKEND =
+    "v1.farms.fake_engine.FakeForestAnalyzer". Protected areas use the local
+    WDPA index like the other backends.
+    """
+
+    def get_fractions(self, salt, count=1):
+        """
+        Returns fractions between 0 and 1 derived from the geometry, the
+        analysis parameters and a salt.
+
+        Args:
+            salt (str): Distinguishes the metrics of the same farm.
+            count (int): The number of fractions, at most 16.
+
+        Returns:
+            list: The fractions.
+        """
+        key = "|".join([
+            get_geometry_key(self.geo_json), str(self.buffer_area),
+            str(self.canopy_dens), self.dataset, salt
+        ])
+        digest = hashlib.sha256(key.encode("utf-8")).digest()
+        return [
+            int.from_bytes(digest[index * 2:index * 2 + 2], "big") / 65535
+            for index in range(count)
+        ]
+
+    def simulate_request(self):
+        """
+        Waits for the configured latency, with a +-50% jitter, and raises a
+        TransientAnalysisError with the configured failure rate.
+        """
+        latency = settings.FAKE_ANALYZER_LATENCY
+        if latency:
+            time.sleep(latency * random.uniform(0.5, 1.5))
+        if random.random() < settings.FAKE_ANALYZER_FAILURE_RATE:
+            raise TransientAnalysisError("Injected Earth Engine failure.")
+
+    def get_area(self):
+        """Returns the area of the buffered polygon in hectares."""
+        return self.calculate_area(self.get_buffered_geo_json())
+
+    def calculate_tree_cover(self) -> float:
+        """
+        Returns a tree cover of up to the whole area, denser canopies
+        covering less.
+        """
+        self.simulate_request()
+        fraction, = self.get_fractions("tree_cover")
+        return self.get_area() * fraction * (1 - self.canopy_dens / 100)
+
+    def calculate_primary_forest(self) -> float:
+        """
+        Returns a primary forest of up to half the area.
+        """
+        self.simulate_request()
+        fraction, = self.get_fractions("primary_forest")
+        return self.get_area() * fraction / 2
+
+    def calculate_yearly_tree_cover_loss(self) -> dict:
+        """
+        Returns loss in up to three years of the dataset, for a quarter of
+        the farms, of up to a tenth of the area each.
+        """
+        self.simulate_request()
+        last_year = get_dataset_loss_year(self.dataset)
+        has_loss, *fractions = self.get_fractions("loss", 7)
+        if has_loss >= 0.25:
+            return {}
+        area = self.get_area()
+        years = last_year - FIRST_LOSS_YEAR + 1
+        losses = {}
+        for year_fraction, area_fraction in zip(
+                fractions[::2], fractions[1::2]):
+            year = FIRST_LOSS_YEAR + min(int(year_fraction * years), years - 1)
+            losses[str(year)] = area * area_fraction / 10
+        return losses
@@ -0,0 +1,146 @@
+"""
+Benchmarks how fast the analysis queue drains with the fake backend.
+
+Usage::
+
+    python manage.py benchmark_analysis_queue --company <company id> \
+        --farms 1000 --workers 1 4 8 --claim-size 10 100 --latency 0.2
+
+Every combination of workers and claim size queues the farms again and 
+drains the queue with that many concurrent `analysis_sync` workers, threads
+sharing the process, which is close enough for an I/O bound backend.
+
+The workers overwrite the results of the farms with fake ones and drain 
+whatever else is queued, so the command refuses to run on farms not made by
+`create_benchmark_tenant` or while other entries are queued, unless 
+--force is given.
+"""
+import threading
+import time
+from itertools import product
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+
+from v1.farms import tasks
+from v1.farms.models import Farm
+from v1.supply_chains.constants import AnalysisPriority, SyncStatus
+from v1.supply_chains.models.analysis import AnalysisQueue
+
+FAKE_BACKEND = "v1.farms.fake_engine.FakeForestAnalyzer"
+BENCHMARK_PREFIX = "benchmark-"  # External id prefix of the benchmark farms
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the drain rate of the analysis queue with the fake "
+        "analysis backend for different worker counts and claim sizes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", required=True,
+                            help="The id of the company whose farms are "
+                                 "analysed.")
+        parser.add_argument("--farms", type=int, default=1000)
+        parser.add_argument("--workers", type=int, nargs="+", default=[1])
+        parser.add_argument("--claim-size", type=int, nargs="+", 
+                            default=[tasks.ANALYSIS_CLAIM_SIZE])
+        parser.add_argument("--latency", type=float, default=0.1,
+                            help="Seconds per fake Earth Engine call.")
+        parser.add_argument("--failure-rate", type=float, default=0,
+                            help="Share of the fake calls failing with a "
+                                 "temporary error.")
+        parser.add_argument("--force", action="store_true",
+                            help="Run on farms that are not benchmark farms "
+                                 "and while other entries are queued.")
+
+    def handle(self, *args, **options):
+        farm_ids = list(Farm.objects.filter(
+            farmer__company_id=options["company"]
+        ).values_list("id", flat=True)[:options["farms"]])
+        if not farm_ids:
+            raise CommandError(f"Company {options['company']} has no farms.")
+        if not options["force"]:
+            self.check_benchmark_state(farm_ids)
+
+        with override_settings(
+                FOREST_ANALYZER_BACKEND=FAKE_BACKEND,
+                FAKE_ANALYZER_LATENCY=options["latency"],
+                FAKE_ANALYZER_FAILURE_RATE=options["failure_rate"]), \
+                mock.patch.object(tasks, "refresh_company_report_snapshots"):
+            for workers, claim_size in product(
+                    options["workers"], options["claim_size"]):
+                result = self.drain(farm_ids, workers, claim_size)
+                self.stdout.write(
+                    f"workers {workers:3d}  claim size {claim_size:5d}  "
+                    f"{result['seconds']:8.1f} s  "
+                    f"{result['farms_per_minute']:8.1f} farms/min  "
+                    f"{result['failed']} failed")
+
+    def check_benchmark_state(self, farm_ids):
+        """
+        Refuses to overwrite the results of real farms and to drain the 
+        entries queued by others.
+
+        Args:
+            farm_ids (list): The ids of the benchmarked farms.
+
+        Raises:
+            CommandError: If a farm is not a benchmark farm or other entries
+                are queued.
+        """
+        real_farms = Farm.objects.filter(id__in=farm_ids).exclude(
+            external_id__startswith=BENCHMARK_PREFIX).count()
+        if real_farms:
+            raise CommandError(
+                f"{real_farms} farms are not benchmark farms, their results "
+                f"would be overwritten. Use --force to run anyway.")
+        queued = AnalysisQueue.objects.filter(
+            status__in=[SyncStatus.IN_QUEUE, SyncStatus.STARTED]).count()
+        if queued:
+            raise CommandError(
+                f"{queued} entries are queued for analysis and would be "
+                f"drained with fake results. Use --force to run anyway.")
+
+    def drain(self, farm_ids, workers, claim_size):
+        """
+        Queues the farms and analyses them with concurrent workers.
+
+        Entries failing with injected temporary errors are requeued with a 
+        delay and not retried within the run, they are counted as failed.
+
+        Returns:
+            dict: The run time, the drain rate and the failed entries.
+        """
+        queue = AnalysisQueue.objects.bulk_create([
+            AnalysisQueue(farm_id=farm_id, 
+                          priority=AnalysisPriority.BACKGROUND)
+            for farm_id in farm_ids
+        ])
+        queue_ids = [entry.id for entry in queue]
+
+        def work():
+            try:
+                tasks.analysis_sync()
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=work) for _ in range(workers)]
+        start = time.perf_counter()
+        with mock.patch.object(tasks, "ANALYSIS_CLAIM_SIZE", claim_size):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        seconds = time.perf_counter() - start
+
+        entries = AnalysisQueue.objects.filter(id__in=queue_ids)
+        completed = entries.filter(status=SyncStatus.COMPLETED).count()
+        failed = len(queue_ids) - completed
+        entries.delete()
+        return {
+            "seconds": seconds,
+            "farms_per_minute": completed / seconds * 60,
+            "failed": failed,
+        }
@@ -0,0 +1,183 @@
+"""
+Benchmarks the latency and query count of the heavy API endpoints.
+
+Usage::
+
+    python manage.py benchmark_api --company <company id> --repeat 20
+
+The results are appended to a JSON lines file with the time and git 
+revision of the run, and compared with the previous run of the same 
+company, so regressions show up across commits.
+"""
+import json
+import statistics
+import subprocess
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from base import session
+from v1.farms import tasks
+from v1.farms.constants import Pillers, TreeCoverLossStandard
+from v1.farms.managers import ReportSnapshotQuerySet
+from v1.farms.models import Farm
+from v1.supply_chains.models.nodes import Company
+
+ENDPOINTS = {
+    "stats": ("/navigate/farms/stats/", {"piller": Pillers.DEFORESTATION}),
+    "analysis": (
+        "/navigate/farms/analysis/", {"piller": Pillers.DEFORESTATION}),
+    "details": ("/navigate/farms/analysis/details/", {
+        "piller": Pillers.DEFORESTATION, 
+        "method": TreeCoverLossStandard.EUDR.label,
+    }),
+    "geo-jsons": ("/navigate/farms/farms/geo-jsons/", {}),
+    "user-info": ("/navigate/supply-chains/user-info/", {}),
+    "farm list": ("/navigate/farms/farms/", {}),
+}
+DEFAULT_OUTPUT = Path(settings.BASE_DIR) / "benchmarks" / "api.jsonl"
+
+
+def percentile(values, percent):
+    """Returns the nearest rank percentile of the values."""
+    values = sorted(values)
+    index = max(0, int(round(percent / 100 * len(values))) - 1)
+    return values[index]
+
+
+def get_revision():
+    """Returns the git revision of the tree, None outside of a checkout."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the p50/p95 latency and query count of the stats, "
+        "analysis, details, geo-jsons, user-info and farm list endpoints.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--company", required=True,
+                            help="The id of the company to request as.")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--endpoint", action="append", 
+                            choices=list(ENDPOINTS),
+                            help="Only benchmark these endpoints.")
+        parser.add_argument("--snapshots", action="store_true",
+                            help="Serve the reports from their snapshots "
+                                 "instead of computing them.")
+        parser.add_argument("--output", default=str(DEFAULT_OUTPUT))
+
+    def handle(self, *args, **options):
+        company = Company.objects.filter(id=options["company"]).first()
+        if not company:
+            raise CommandError(f"Company {options['company']} not found.")
+        user = company.users.first()
+        if not user:
+            raise CommandError(f"Company {company.id} has no users.")
+
+        results = {}
+        for name in options["endpoint"] or ENDPOINTS:
+            path, params = ENDPOINTS[name]
+            results[name] = self.benchmark(
+                path, params, company, user, options["repeat"], 
+                options["snapshots"])
+
+        output = Path(options["output"])
+        previous = self.get_previous_run(output, company)
+        for name, result in results.items():
+            line = (
+                f"{name:<10} p50 {result['p50_ms']:8.1f} ms  "
+                f"p95 {result['p95_ms']:8.1f} ms  "
+                f"{result['queries']:4d} queries")
+            before = previous.get(name)
+            if before:
+                line += (
+                    f"  (p50 {result['p50_ms'] - before['p50_ms']:+.1f} ms,"
+                    f" {result['queries'] - before['queries']:+d} queries)")
+            self.stdout.write(line)
+
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with output.open("a") as file:
+            file.write(json.dumps({
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "revision": get_revision(),
+                "company": str(company.id),
+                "farms": Farm.objects.filter(farmer__company=company).count(),
+                "repeat": options["repeat"],
+                "results": results,
+            }) + "\n")
+
+    def benchmark(self, path, params, company, user, repeat, snapshots):
+        """
+        Requests an endpoint `repeat` times, after one warm up request.
+
+        The view is called directly with the user authenticated, so the 
+        numbers cover the view, its queries and the rendering, not the 
+        authentication or the network. Report snapshots are neither read
+        nor queued unless `snapshots` is set.
+
+        Returns:
+            dict: The p50 and p95 latency in ms and the queries of the last
+                request.
+        """
+        view = resolve(path).func
+        factory = APIRequestFactory()
+        timings = []
+        queries = 0
+        with ExitStack() as stack:
+            stack.enter_context(
+                mock.patch.object(tasks, "request_report_snapshot"))
+            if not snapshots:
+                stack.enter_context(mock.patch.object(
+                    ReportSnapshotQuerySet, "get_snapshot", 
+                    return_value=None))
+            for attempt in range(repeat + 1):
+                request = factory.get(path, params)
+                force_authenticate(request, user=user)
+                session.set_to_local("user_id", user.pk.hashid)
+                session.set_to_local("company_id", company.pk.hashid)
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    response = view(request)
+                    response.render()
+                    duration = (time.perf_counter() - start) * 1000
+                if response.status_code != 200:
+                    raise CommandError(
+                        f"{path} returned {response.status_code}: "
+                        f"{response.content[:200]}")
+                if attempt:
+                    timings.append(duration)
+                queries = len(context.captured_queries)
+        return {
+            "p50_ms": round(statistics.median(timings), 1),
+            "p95_ms": round(percentile(timings, 95), 1),
+            "queries": queries,
+        }
+
+    def get_previous_run(self, output, company):
+        """
+        Returns the results of the last run for the company in the output 
+        file, keyed by endpoint.
+        """
+        if not output.exists():
+            return {}
+        previous = {}
+        with output.open() as file:
+            for line in file:
+                run = json.loads(line)
+                if run["company"] == str(company.id):
+                    previous = run["results"]
+        return previous
@@ -0,0 +1,187 @@
+"""
+Generates a large synthetic tenant for benchmarking.
+
+Usage::
+
+    python manage.py create_benchmark_tenant --companies 5 \
+        --farmers 100000 --farms 500000
+"""
+import time
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from faker import Faker
+
+from v1.farms.models import Farm, FarmProperty, YearlyTreeCoverLoss
+from v1.farms.tasks import LOSS_ANALYSES
+from v1.farms.utils import HexagonUtils, get_geometry_properties
+from v1.supply_chains.models.batches import Batch
+from v1.supply_chains.models.nodes import Company, Farmer, SupplyChain
+
+BULK_SIZE = 10000
+# Farms are scattered over Sierra Leone, [min lon, min lat, max lon, max lat]
+BOUNDS = (-13.2, 7.0, -10.4, 9.9)
+COUNTRY = "Sierra Leone"
+STATE = "Western Area"
+LOSS_YEARS = range(2015, 2024)
+DATASET = "UMD/hansen/global_forest_change_2023_v1_11"
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk generates benchmark companies with farmers, farm polygons, "
+        "farm properties, yearly tree cover loss and batches.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--companies", type=int, default=1)
+        parser.add_argument("--farmers", type=int, default=100_000,
+                            help="Farmers of all companies together.")
+        parser.add_argument("--farms", type=int, default=500_000,
+                            help="Farms of all companies together.")
+        parser.add_argument("--batches", type=int, default=100,
+                            help="Batches per company.")
+        parser.add_argument("--batch-farmers", type=int, default=500,
+                            help="Farmers per batch.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        faker = Faker()
+        Faker.seed(options["seed"])
+        start = time.perf_counter()
+
+        supply_chain, _ = SupplyChain.objects.get_or_create(name="Cocoa")
+        user = get_user_model().objects.create_user(
+            email=f"benchmark-{faker.uuid4()}@example.com")
+        companies = []
+        for _ in range(options["companies"]):
+            company = Company.objects.create(
+                name=f"Benchmark {faker.company()}", state=STATE,
+                country=COUNTRY)
+            company.users.add(user)
+            company.supply_chains.add(supply_chain)
+            companies.append(company)
+
+        farmer_ids = self.create_farmers(
+            companies, options["farmers"], supply_chain, faker)
+        self.create_farms(farmer_ids, options["farms"], rng)
+        self.create_batches(
+            companies, supply_chain, options["batches"],
+            options["batch_farmers"], rng)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(companies)} companies "
+            f"({', '.join(str(company.id) for company in companies)}) for "
+            f"user {user.email} in {time.perf_counter() - start:.0f}s"))
+
+    def create_farmers(self, companies, count, supply_chain, faker):
+        """
+        Creates the farmers, spread evenly over the companies, and adds
+        them to the supply chain.
+
+        Returns:
+            list: The (farmer id, company id) pairs.
+        """
+        farmers = Farmer.objects.bulk_create(
+            (Farmer(name=faker.name(), external_id=str(index),
+                    company=companies[index % len(companies)],
+                    state=STATE, country=COUNTRY)
+             for index in range(count)),
+            batch_size=BULK_SIZE)
+        FarmerSupplyChain = Farmer.supply_chains.through
+        FarmerSupplyChain.objects.bulk_create(
+            (FarmerSupplyChain(farmer_id=farmer.id,
+                               supplychain_id=supply_chain.id)
+             for farmer in farmers),
+            batch_size=BULK_SIZE)
+        self.stdout.write(f"Created {len(farmers)} farmers")
+        return [(farmer.id, farmer.company_id) for farmer in farmers]
+
+    def create_farms(self, farmer_ids, count, rng):
+        """
+        Creates the farms with irregular hexagon polygons of 0.5 to 5 ha,
+        their properties and yearly tree cover loss, in chunks.
+        """
+        hexagon_utils = HexagonUtils()
+        for offset in range(0, count, BULK_SIZE):
+            size = min(BULK_SIZE, count - offset)
+            owners = rng.integers(0, len(farmer_ids), size)
+            longitudes = rng.uniform(BOUNDS[0], BOUNDS[2], size)
+            latitudes = rng.uniform(BOUNDS[1], BOUNDS[3], size)
+            rings = hexagon_utils.create_hexagons(
+                latitudes, longitudes, rng.uniform(0.5, 5, size))
+            # Scale every vertex towards or away from the center, so the
+            # farms are not regular hexagons
+            centers = np.stack([longitudes, latitudes], axis=1)[:, None]
+            rings = centers + (rings - centers) * rng.uniform(
+                0.7, 1.3, rings.shape[:2] + (1,))
+            rings[:, -1] = rings[:, 0]
+            geometries = [
+                {"type": "Polygon", "coordinates": [ring]}
+                for ring in rings.tolist()
+            ]
+
+            farms = Farm.objects.bulk_create([
+                Farm(farmer_id=farmer_ids[owner][0],
+                     external_id=f"benchmark-{offset + index}",
+                     state=STATE, country=COUNTRY, analysis_radius=30,
+                     geo_json={
+                         "type": "Feature", "properties": {},
+                         "geometry": geometry
+                     })
+                for index, (owner, geometry) in enumerate(
+                    zip(owners.tolist(), geometries))
+            ], batch_size=BULK_SIZE)
+            FarmProperty.objects.bulk_create([
+                FarmProperty(
+                    farm=farm, **properties,
+                    primary_forest_area=float(rng.uniform(0, 1)),
+                    tree_cover_extent=float(rng.uniform(0, 3)),
+                    protected_area=float(rng.choice([0, 0, 0, 0.5])),
+                    near_protected_area=bool(rng.random() < 0.1),
+                    dataset_version=DATASET)
+                for farm, properties in zip(
+                    farms, get_geometry_properties(geometries))
+            ], batch_size=BULK_SIZE)
+            YearlyTreeCoverLoss.objects.bulk_create(
+                self.get_losses(farms, rng), batch_size=BULK_SIZE)
+            self.stdout.write(f"Created {offset + size} farms")
+
+    def get_losses(self, farms, rng):
+        """
+        Yields up to three loss years per farm and analysis, for a quarter
+        of the farms.
+        """
+        for farm in farms:
+            if rng.random() >= 0.25:
+                continue
+            for canopy_density, radius in LOSS_ANALYSES:
+                years = rng.choice(
+                    LOSS_YEARS, rng.integers(1, 4), replace=False)
+                for year in years.tolist():
+                    yield YearlyTreeCoverLoss(
+                        farm=farm, year=year, canopy_density=canopy_density,
+                        radius=radius, value=float(rng.uniform(0.01, 0.5)),
+                        dataset_version=DATASET)
+
+    def create_batches(self, companies, supply_chain, count, size, rng):
+        """
+        Creates batches of randomly picked farmers of every company.
+        """
+        BatchFarmer = Batch.farmers.through
+        for company in companies:
+            farmer_ids = np.array(Farmer.objects.filter(
+                company=company).values_list("id", flat=True))
+            batches = Batch.objects.bulk_create(
+                Batch(external_id=f"benchmark-{company.id}-{index}",
+                      supply_chain=supply_chain)
+                for index in range(count))
+            links = [
+                BatchFarmer(batch_id=batch.id, farmer_id=farmer_id)
+                for batch in batches
+                for farmer_id in rng.choice(
+                    farmer_ids, min(size, len(farmer_ids)), replace=False)
+            ]
+            BatchFarmer.objects.bulk_create(links, batch_size=BULK_SIZE)
+        self.stdout.write(f"Created {count} batches per company")
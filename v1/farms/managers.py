@@ -1,21 +1,36 @@
+import json
+from datetime import timedelta
+from hashlib import md5
+
+from django.conf import settings
 from django.db import models
-from django.db.models import Sum, Avg, Count, FloatField
+from django.db.models import Sum, Avg, Count, FloatField, OuterRef, Q
 from django.db.models.functions import Coalesce, Cast
+from django.utils import timezone
+from v1.farms.constants import REPORT_FILTERS, TREE_COVER_LOSS_RADII
 from v1.farms.constants import TreeCoverLossStandard
+from v1.farms.backends import BaseForestAnalyzer
+from v1.farms.utils import get_geometry_properties, is_polygon_valid
 
 
 FarmFilter = {
     TreeCoverLossStandard.RAINFOREST_ALLIANCE: {
         "year__gte": 2014,
         "canopy_density": 10,
+        "radius": TREE_COVER_LOSS_RADII[
+            TreeCoverLossStandard.RAINFOREST_ALLIANCE],
     },
     TreeCoverLossStandard.FAIRTRADE: {
         "year__gte": 2019,
         "canopy_density": 10,
+        "radius": TREE_COVER_LOSS_RADII[
+            TreeCoverLossStandard.FAIRTRADE],
     },
     TreeCoverLossStandard.EUDR: {
         "year__gte": 2020,
         "canopy_density": 30,
+        "radius": TREE_COVER_LOSS_RADII[
+            TreeCoverLossStandard.EUDR],
     },
 }
 
@@ -45,6 +60,25 @@ class FarmQuerySet(models.QuerySet):
         return self.aggregate(
             total_area=Sum('property__total_area'))["total_area"]
 
+    def analysed_area(self):
+        """
+        Returns the total area of the farms whose raster metrics are 
+        analysed.
+
+        The properties of a farm are created with its area when the farm is
+        saved, the raster metrics stay 0 until the analysis sets the 
+        dataset version, so the shares of the raster metrics are taken of 
+        the analysed area only.
+
+        Returns:
+            float: The area in hectares.
+        """
+        return self.aggregate(
+            analysed_area=Sum(
+                'property__total_area', 
+                filter=Q(property__dataset_version__isnull=False))
+        )["analysed_area"]
+
     def primary_forest_area(self):
         """
         Annotates farms with the average primary forest area of their 
@@ -57,7 +91,7 @@ class FarmQuerySet(models.QuerySet):
         primary_forest = self.aggregate(
             primary_forest_area=Sum('property__primary_forest_area')
         )["primary_forest_area"] or 0
-        total_area = self.total_area() or 0
+        total_area = self.analysed_area() or 0
         return self.calc_percentage(primary_forest, total_area)
     
     def tree_cover_extent(self):
@@ -71,7 +105,7 @@ class FarmQuerySet(models.QuerySet):
         tree_cover = self.aggregate(
             tree_cover_extent=Sum('property__tree_cover_extent')
         )["tree_cover_extent"] or 0
-        total_area = self.total_area() or 0
+        total_area = self.analysed_area() or 0
         return self.calc_percentage(tree_cover, total_area)
     
     def protected_area(self):
@@ -102,7 +136,7 @@ class FarmQuerySet(models.QuerySet):
         """
         YearlyTreeCoverLoss = self.model.yearly_tree_cover_losses.field.model
         queryset = YearlyTreeCoverLoss.objects.filter(
-            farm__in=self, **FarmFilter[method])
+            farm__in=self).filter_by_standard(method)
         return queryset.aggregate(
             sum=Coalesce(Cast(Sum('value'), output_field=FloatField()), 0.0),
             count=Count('value')
@@ -143,7 +177,7 @@ class FarmQuerySet(models.QuerySet):
         if country:
             self = self.filter(country=country)
         if batch:
-            self = self.filter(farmer__batches__id=batch).distinct()
+            self = self.filter_by_batch(batch)
         if _state:
             self = self.filter(state=_state)
         if farmer:
@@ -163,6 +197,126 @@ class FarmQuerySet(models.QuerySet):
         #     self = self.filter(yearly_tree_cover_losses__in=queryset)
         return self
         
+    def filter_by_batch(self, batch):
+        """
+        Filter farms whose farmer is part of the given batch.
+
+        The batch-farmer links are resolved in an ``IN`` subquery instead of
+        joining them into the farm rows, which would need a ``DISTINCT``.
+
+        Args:
+            batch: The batch id to filter by.
+
+        Returns:
+            QuerySet: The filtered queryset.
+        """
+        Farmer = self.model.farmer.field.related_model
+        batch_farmers = Farmer.batches.through.objects.filter(
+            batch_id=batch).values('farmer_id')
+        return self.filter(farmer_id__in=batch_farmers)
+
+    def with_raw_geo_json(self):
+        """
+        Defers the geo_json of the farms and annotates its JSON text as
+        ``geo_json_text``.
+
+        The text is rendered verbatim by `base.fields.RawJSONField`, instead
+        of the jsonb being decoded into Python objects and encoded again.
+
+        Returns:
+            QuerySet: The annotated queryset.
+        """
+        return self.defer('geo_json').annotate(
+            geo_json_text=Cast('geo_json', models.TextField()))
+
+class YearlyTreeCoverLossQuerySet(models.QuerySet):
+    """
+    Custom QuerySet for selecting the tree cover losses of a standard.
+    """
+
+    def filter_by_standard(self, method):
+        """
+        Filters the losses counted by a tree cover loss standard.
+
+        Farms analysed before the standards' radii were introduced only have
+        losses of the farm polygon itself, with a radius of 0, until their 
+        reanalysis completes. Their unbuffered losses are counted instead 
+        of no loss at all. The buffered area contains the farm, so a farm
+        with unbuffered losses and no buffered ones has not been reanalysed.
+
+        Args:
+            method (str): The standard, a TreeCoverLossStandard.
+
+        Returns:
+            QuerySet: The losses of the standard's year, canopy density and
+                radius.
+        """
+        filters = dict(FarmFilter[method])
+        radius = filters.pop('radius')
+        self = self.filter(**filters)
+        if not radius:
+            return self.filter(radius=0)
+        buffered = self.model.objects.filter(
+            farm=OuterRef('farm'), canopy_density=filters['canopy_density'],
+            radius=radius)
+        return self.filter(
+            models.Q(radius=radius) 
+            | models.Q(radius=0) & ~models.Exists(buffered))
+
+
+class FarmPropertyQuerySet(models.QuerySet):
+    """
+    A custom QuerySet for the FarmProperty model.
+    """
+
+    GEOMETRY_FIELDS = (
+        "total_area", "centroid_latitude", "centroid_longitude", "bbox")
+
+    def update_geometry(self, farms):
+        """
+        Derives the geometry properties of farms from their geo_json and 
+        saves them.
+
+        The area, centroid and bounding box are computed locally for all 
+        farms at once, so they are available as soon as the farms are 
+        saved, before the raster metrics are analysed. Farms without a 
+        valid geometry are skipped.
+
+        Args:
+            farms (list): The Farm objects.
+
+        Returns:
+            list: The created or updated FarmProperty objects.
+        """
+        farms = [
+            farm for farm in farms 
+            if farm.geo_json and "geometry" in farm.geo_json 
+            and is_polygon_valid(farm.geo_json["geometry"])
+        ]
+        values = get_geometry_properties([
+            BaseForestAnalyzer.handle_incorrect_polygon(
+                farm.geo_json["geometry"])
+            for farm in farms
+        ])
+        existing = {
+            farm_property.farm_id: farm_property
+            for farm_property in self.filter(farm__in=farms)
+        }
+        created, updated = [], []
+        for farm, farm_values in zip(farms, values):
+            farm_property = existing.get(farm.pk)
+            if not farm_property:
+                farm_property = self.model(farm=farm)
+                created.append(farm_property)
+            else:
+                updated.append(farm_property)
+            for field, value in farm_values.items():
+                setattr(farm_property, field, value)
+        self.bulk_create(created)
+        self.bulk_update(updated, self.GEOMETRY_FIELDS)
+        return created + updated
+
+
 class FarmCommentQuerySet(models.QuerySet):
     """
     Custom QuerySet for filtering farm comments based on query parameters.
@@ -199,6 +353,65 @@ class FarmCommentQuerySet(models.QuerySet):
         if piller:
             self = self.filter(piller=piller)
         return self
-        
-    
 
+
+class ReportSnapshotQuerySet(models.QuerySet):
+    """
+    Custom QuerySet for looking up report snapshots by their filter set.
+    """
+
+    @staticmethod
+    def clean_filters(kwargs):
+        """
+        Returns the report filters from the given query parameters.
+
+        Args:
+            kwargs: The query parameters of the request.
+
+        Returns:
+            dict: The non-empty report filters, sorted by name.
+        """
+        return {
+            key: str(kwargs.get(key)) for key in sorted(REPORT_FILTERS) 
+            if kwargs.get(key)
+        }
+
+    @staticmethod
+    def get_filter_key(filters):
+        """
+        Returns a stable hash of the cleaned filters.
+
+        Args:
+            filters (dict): The cleaned report filters.
+
+        Returns:
+            str: The md5 hex digest of the filters.
+        """
+        data = json.dumps(filters, sort_keys=True)
+        return md5(data.encode("utf-8")).hexdigest()
+
+    def get_snapshot(self, company, piller, kwargs):
+        """
+        Returns the generated snapshot for the company and filter set.
+
+        Snapshots older than settings.REPORT_SNAPSHOT_MAX_AGE seconds are 
+        ignored, so the report is recomputed and the snapshot regenerated 
+        even if no change triggered a refresh.
+
+        Args:
+            company: The company of the report.
+            piller (str): The piller of the report.
+            kwargs: The query parameters of the request.
+
+        Returns:
+            ReportSnapshot: The snapshot or None if it is not generated yet
+                or is too old.
+        """
+        filters = self.clean_filters(kwargs)
+        oldest = timezone.now() - timedelta(
+            seconds=settings.REPORT_SNAPSHOT_MAX_AGE)
+        return self.filter(
+            company=company, piller=piller, 
+            filter_key=self.get_filter_key(filters),
+            generated_on__gte=oldest
+        ).first()
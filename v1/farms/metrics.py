@@ -0,0 +1,138 @@
+"""
+Prometheus metrics of the forest analysis pipeline.
+
+The metrics are recorded by the analysis backends and tasks, and exposed by
+the `/navigate/metrics/` endpoint and, for Celery workers, by the exporter
+started with `start_exporter`. Web and worker processes that fork, gunicorn
+workers or the Celery prefork pool, have to share their metrics through the
+directory in the PROMETHEUS_MULTIPROC_DIR environment variable.
+"""
+import functools
+import os
+import time
+
+from django.db.models import Count
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY
+from prometheus_client import CollectorRegistry, Counter, Histogram
+from prometheus_client import generate_latest, multiprocess
+from prometheus_client import start_http_server
+from prometheus_client.core import GaugeMetricFamily
+
+# Earth Engine calls take from a fraction of a second to minutes
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+ANALYZER_CALL_SECONDS = Histogram(
+    "navigate_analyzer_call_seconds",
+    "Duration of the forest analyzer methods.",
+    ["backend", "method"], buckets=LATENCY_BUCKETS)
+EE_REQUEST_SECONDS = Histogram(
+    "navigate_ee_request_seconds",
+    "Duration of the Earth Engine getInfo requests, retries excluded.",
+    buckets=LATENCY_BUCKETS)
+EE_ERRORS = Counter(
+    "navigate_ee_errors",
+    "Failed Earth Engine requests, by transient or permanent error.",
+    ["kind"])
+ANALYSIS_SECONDS = Histogram(
+    "navigate_analysis_seconds",
+    "Duration of the analysis of a queued farm.", buckets=LATENCY_BUCKETS)
+ANALYSED_FARMS = Counter(
+    "navigate_analysed_farms",
+    "Analysed queue entries by resulting status.", ["status"])
+
+
+class AnalysisQueueCollector:
+    """
+    Collects the depth of the analysis queue by status and priority from
+    the database at scrape time.
+    """
+
+    def collect(self):
+        from v1.supply_chains.constants import AnalysisPriority, SyncStatus
+        from v1.supply_chains.models.analysis import AnalysisQueue
+
+        depth = GaugeMetricFamily(
+            "navigate_analysis_queue_depth",
+            "Analysis queue entries by status and priority.",
+            labels=["status", "priority"])
+        counts = AnalysisQueue.objects.order_by().values_list(
+            "status", "priority").annotate(count=Count("id"))
+        for status, priority, count in counts:
+            depth.add_metric([
+                SyncStatus(status).name.lower(),
+                AnalysisPriority(priority).name.lower()
+            ], count)
+        yield depth
+
+
+def get_registry():
+    """
+    Returns the registry of the metrics recorded by this process, or by all
+    processes sharing PROMETHEUS_MULTIPROC_DIR.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def generate_metrics():
+    """
+    Renders the recorded metrics and the analysis queue depth.
+
+    Returns:
+        tuple: The metrics in the Prometheus text format and their content
+            type.
+    """
+    queue_registry = CollectorRegistry()
+    queue_registry.register(AnalysisQueueCollector())
+    output = generate_latest(get_registry()) + generate_latest(queue_registry)
+    return output, CONTENT_TYPE_LATEST
+
+
+def start_exporter(port):
+    """
+    Serves the metrics recorded by the Celery workers on a port, for the
+    workers that do not serve web requests.
+
+    Args:
+        port (int): The port of the exporter.
+    """
+    start_http_server(port, registry=get_registry())
+
+
+def mark_process_dead(pid):
+    """
+    Drops the live gauges of a stopped process sharing
+    PROMETHEUS_MULTIPROC_DIR.
+
+    Args:
+        pid (int): The id of the stopped process.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid)
+
+
+def timed_analyzer_method(backend, method):
+    """
+    Wraps an analyzer method to record its duration in
+    ANALYZER_CALL_SECONDS.
+
+    Args:
+        backend (str): The name of the analyzer class.
+        method (Callable): The method to wrap.
+
+    Returns:
+        Callable: The wrapped method.
+    """
+    histogram = ANALYZER_CALL_SECONDS.labels(backend, method.__name__)
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+    return wrapper
@@ -0,0 +1,45 @@
+# Generated by Django 4.0.4 on 2026-10-19 03:43
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+import hashid_field.field
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supply_chains', '0008_analysisqueue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('farms', '0006_yearlytreecoverloss_delete_deforestationsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSnapshot',
+            fields=[
+                ('id', hashid_field.field.HashidAutoField(alphabet='abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ1234567890', min_length=7, prefix='', primary_key=True, serialize=False)),
+                ('updated_on', models.DateTimeField(auto_now=True, verbose_name='Updated On')),
+                ('created_on', models.DateTimeField(auto_now_add=True, verbose_name='Updated On')),
+                ('piller', models.CharField(choices=[('DEFORESTATION', 'Deforestation')], max_length=255)),
+                ('filters', models.JSONField(blank=True, default=dict)),
+                ('filter_key', models.CharField(max_length=32)),
+                ('stats', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('analysis', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('details', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('generated_on', models.DateTimeField(blank=True, null=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_snapshots', to='supply_chains.company')),
+                ('creator', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='creator_%(class)s_objects', to=settings.AUTH_USER_MODEL, verbose_name='Creator')),
+                ('updater', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='updater_%(class)s_objects', to=settings.AUTH_USER_MODEL, verbose_name='Updater')),
+            ],
+            options={
+                'ordering': ('-created_on',),
+                'abstract': False,
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reportsnapshot',
+            constraint=models.UniqueConstraint(fields=('company', 'piller', 'filter_key'), name='unique_report_snapshot'),
+        ),
+    ]
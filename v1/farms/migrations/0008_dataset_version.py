@@ -0,0 +1,34 @@
+# Generated by Django 4.0.4 on 2026-10-19 03:45
+
+from django.db import migrations, models
+
+LEGACY_DATASET = "UMD/hansen/global_forest_change_2023_v1_11"
+
+
+def set_legacy_dataset_version(apps, schema_editor):
+    """Marks the existing results as computed with the legacy dataset."""
+    for model_name in ('FarmProperty', 'YearlyTreeCoverLoss'):
+        model = apps.get_model('farms', model_name)
+        model.objects.update(dataset_version=LEGACY_DATASET)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farms', '0007_reportsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmproperty',
+            name='dataset_version',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='yearlytreecoverloss',
+            name='dataset_version',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.RunPython(
+            set_legacy_dataset_version, migrations.RunPython.noop),
+    ]
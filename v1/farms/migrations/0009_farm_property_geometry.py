@@ -0,0 +1,153 @@
+# Generated by Django 4.0.4 on 2026-10-19 03:53
+
+import math
+from functools import lru_cache
+
+import numpy as np
+import shapely
+from django.db import migrations, models
+from pyproj import Transformer
+from shapely.geometry import shape
+
+BATCH_SIZE = 1000
+
+# The geometry helpers of v1.farms are inlined as they were when the 
+# migration was written, so later changes to them do not change it.
+
+# Cylindrical equal-area projection of the WGS84 ellipsoid, areas of planar
+# polygons in it are their true areas on the ellipsoid
+EQUAL_AREA_CRS = "+proj=cea +datum=WGS84 +units=m"
+# Area in hectares of the hexagon drawn around farms uploaded as one point
+POINT_FARM_AREA = 0.25
+
+
+@lru_cache(maxsize=None)
+def get_transformer(from_crs, to_crs):
+    """Returns a cached transformer, with x/y in lon/lat order."""
+    return Transformer.from_crs(from_crs, to_crs, always_xy=True)
+
+
+def get_point_hexagon(longitude, latitude):
+    """
+    Returns the hexagon of POINT_FARM_AREA hectares drawn in the UTM zone 
+    of a point, like the farms uploaded as a single coordinate are analysed.
+    """
+    zone = min(max(math.floor((longitude + 180) / 6) + 1, 1), 60)
+    utm_crs = f"epsg:{(32700 if latitude < 0 else 32600) + zone}"
+    x, y = get_transformer("epsg:4326", utm_crs).transform(longitude, latitude)
+    radius = math.sqrt(2 * POINT_FARM_AREA * 10000 / (3 * math.sqrt(3)))
+    angles = np.radians(np.arange(0, 420, 60))
+    ring = get_transformer(utm_crs, "epsg:4326").transform(
+        x + radius * np.cos(angles), y + radius * np.sin(angles))
+    return shapely.Polygon(np.column_stack(ring))
+
+
+def get_geometry(geometry):
+    """
+    Returns the shapely geometry of a farm geojson geometry, None for 
+    polygons without coordinates.
+    """
+    if geometry["type"] == "Polygon":
+        if not len(geometry["coordinates"][0]):
+            return None
+        if len(geometry["coordinates"][0]) == 1:
+            return get_point_hexagon(*geometry["coordinates"][0][0][:2])
+    return shape(geometry)
+
+
+def get_geometry_properties(geometries):
+    """
+    Derives the area in hectares on the ellipsoid, the centroid and the 
+    bounding box of an array of shapely geometries.
+    """
+    if not len(geometries):
+        return []
+    transformer = get_transformer("epsg:4326", EQUAL_AREA_CRS)
+    projected = shapely.transform(
+        geometries,
+        lambda coordinates: np.column_stack(
+            transformer.transform(coordinates[:, 0], coordinates[:, 1])))
+    centroids = shapely.centroid(geometries)
+    return [
+        {
+            "total_area": area,
+            "centroid_latitude": lat,
+            "centroid_longitude": lon,
+            "bbox": bbox,
+        }
+        for area, lon, lat, bbox in zip(
+            (shapely.area(projected) / 10000).tolist(),
+            shapely.get_x(centroids).tolist(),
+            shapely.get_y(centroids).tolist(),
+            shapely.bounds(geometries).tolist())
+    ]
+
+
+def set_geometry_properties(apps, schema_editor):
+    """
+    Derives the geometry properties of the existing farms, and recomputes 
+    their total area on the ellipsoid.
+    """
+    Farm = apps.get_model('farms', 'Farm')
+    FarmProperty = apps.get_model('farms', 'FarmProperty')
+    fields = ("total_area", "centroid_latitude", "centroid_longitude", "bbox")
+    farms = Farm.objects.exclude(geo_json=None).values_list('id', 'geo_json')
+    batch = []
+    for farm_id, geo_json in farms.iterator(chunk_size=BATCH_SIZE):
+        geometry = geo_json.get("geometry")
+        geometry = get_geometry(geometry) if geometry else None
+        if geometry is not None:
+            batch.append((farm_id, geometry))
+        if len(batch) < BATCH_SIZE:
+            continue
+        save_geometry_properties(FarmProperty, batch, fields)
+        batch = []
+    save_geometry_properties(FarmProperty, batch, fields)
+
+
+def save_geometry_properties(FarmProperty, batch, fields):
+    """Creates or updates the properties of a batch of farms."""
+    values = get_geometry_properties(
+        np.array([geometry for _, geometry in batch]))
+    existing = {
+        farm_property.farm_id: farm_property
+        for farm_property in FarmProperty.objects.filter(
+            farm_id__in=[farm_id for farm_id, _ in batch])
+    }
+    created = []
+    for (farm_id, _), farm_values in zip(batch, values):
+        farm_property = existing.get(farm_id)
+        if not farm_property:
+            farm_property = FarmProperty(farm_id=farm_id)
+            created.append(farm_property)
+        for field, value in farm_values.items():
+            setattr(farm_property, field, value)
+    FarmProperty.objects.bulk_create(created)
+    FarmProperty.objects.bulk_update(existing.values(), fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farms', '0008_dataset_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmproperty',
+            name='bbox',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='farmproperty',
+            name='centroid_latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='farmproperty',
+            name='centroid_longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(
+            set_geometry_properties, migrations.RunPython.noop),
+    ]
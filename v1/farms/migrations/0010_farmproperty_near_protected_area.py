@@ -0,0 +1,18 @@
+# Generated by Django 4.0.4 on 2026-10-19 03:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farms', '0009_farm_property_geometry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmproperty',
+            name='near_protected_area',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.0.4 on 2026-10-19 03:57
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+STARTED = 1  # v1.supply_chains.constants.SyncStatus.STARTED
+IN_QUEUE = 3  # v1.supply_chains.constants.SyncStatus.IN_QUEUE
+
+
+def queue_radius_analysis(apps, schema_editor):
+    """
+    Queues the farms again to compute the tree cover loss within the 
+    standards' radii. Farms with a pending queue entry are skipped, the 
+    entry computes the radii already.
+    """
+    Farm = apps.get_model('farms', 'Farm')
+    AnalysisQueue = apps.get_model('supply_chains', 'AnalysisQueue')
+    pending = AnalysisQueue.objects.filter(
+        farm=OuterRef('pk'), status__in=[STARTED, IN_QUEUE])
+    farm_ids = Farm.objects.exclude(geo_json=None).exclude(
+        Exists(pending)).values_list('id', flat=True)
+    AnalysisQueue.objects.bulk_create(
+        (AnalysisQueue(farm_id=farm_id, status=IN_QUEUE) 
+         for farm_id in farm_ids.iterator()), 
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farms', '0010_farmproperty_near_protected_area'),
+        ('supply_chains', '0008_analysisqueue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='yearlytreecoverloss',
+            name='radius',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(
+            queue_radius_analysis, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,13 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from base.models import AbstractAddressModel
 from base.models import AbstractBaseModel
-from v1.supply_chains.models.nodes import Farmer
+from v1.supply_chains.models.nodes import Company, Farmer
 from .managers import FarmQuerySet
 from .managers import FarmCommentQuerySet
+from .managers import FarmPropertyQuerySet
+from .managers import ReportSnapshotQuerySet
+from .managers import YearlyTreeCoverLossQuerySet
 from .constants import Pillers
 
 class Farm(AbstractAddressModel):
@@ -42,18 +46,33 @@ class FarmProperty(AbstractBaseModel):
 
     Attributes:
         farm (Farm): The farm associated with the properties.
-        total_area (float): The total area of the farm. 
+        total_area (float): The total area of the farm in hectares. 
+        centroid_latitude (float): The latitude of the farm's centroid.
+        centroid_longitude (float): The longitude of the farm's centroid.
+        bbox (list): The bounding box of the farm, as [min longitude, 
+            min latitude, max longitude, max latitude].
         primary_forest_area (float): The area of primary forest in the farm.
         tree_cover_extent (float): The extent of tree cover in the farm.
         protected_area (float): The area of protected land in the farm.
+        near_protected_area (bool): Whether a protected area is within 
+            PROTECTED_AREA_RADIUS of the farm.
+        dataset_version (str): The Hansen dataset the properties were 
+            computed with.
     """
 
     farm = models.OneToOneField(Farm, on_delete=models.CASCADE, 
                              related_name="property")
     total_area = models.FloatField(default=0.0, null=True, blank=True)
+    centroid_latitude = models.FloatField(null=True, blank=True)
+    centroid_longitude = models.FloatField(null=True, blank=True)
+    bbox = models.JSONField(null=True, blank=True)
     primary_forest_area = models.FloatField(default=0.0, null=True, blank=True)
     tree_cover_extent = models.FloatField(default=0.0, null=True, blank=True)
     protected_area = models.FloatField(default=0.0, null=True, blank=True)
+    near_protected_area = models.BooleanField(null=True, blank=True)
+    dataset_version = models.CharField(max_length=255, null=True, blank=True)
+
+    objects = FarmPropertyQuerySet.as_manager()
 
     def __str__(self) -> str:
         """
@@ -105,6 +124,10 @@ class YearlyTreeCoverLoss(AbstractBaseModel):
         year (int): The year of the deforestation summary.
         canopy_density (float): The canopy density of the deforestation.
         value (float): The value of the deforestation summary.
+        radius (int): The radius in meters around the farm the loss was 
+            evaluated in, 0 for the farm polygon itself.
+        dataset_version (str): The Hansen dataset the value was computed 
+            with.
     """
 
     farm = models.ForeignKey(
@@ -112,7 +135,11 @@ class YearlyTreeCoverLoss(AbstractBaseModel):
         related_name="yearly_tree_cover_losses")
     year = models.IntegerField(default=2014)
     canopy_density = models.FloatField(default=30)
+    radius = models.IntegerField(default=0)
     value = models.FloatField(default=0.0)
+    dataset_version = models.CharField(max_length=255, null=True, blank=True)
+
+    objects = YearlyTreeCoverLossQuerySet.as_manager()
 
     def __str__(self) -> str:
         """
@@ -123,3 +150,54 @@ class YearlyTreeCoverLoss(AbstractBaseModel):
         """
         return f"{self.farm} - {self.year}"
 
+
+class ReportSnapshot(AbstractBaseModel):
+    """
+    Represents the frozen report outputs of a company for a filter set.
+
+    The snapshot is filled by a background task and served by the stats and 
+    analysis endpoints instead of recomputing the report on every request.
+
+    Attributes:
+        company (Company): The company of the report.
+        piller (str): The piller of the report.
+        filters (dict): The farm filters of the report.
+        filter_key (str): The hash of the filters, used for lookups.
+        stats (dict): The output of the piller's stats template.
+        analysis (dict): The output of the piller's analysis template.
+        details (dict): The first page of the piller's analysis detail 
+            template, keyed by tree cover loss method.
+        generated_on (datetime): When the outputs were last generated.
+    """
+
+    company = models.ForeignKey(
+        Company, on_delete=models.CASCADE, related_name="report_snapshots")
+    piller = models.CharField(max_length=255, choices=Pillers.choices)
+    filters = models.JSONField(default=dict, blank=True)
+    filter_key = models.CharField(max_length=32)
+    stats = models.JSONField(
+        null=True, blank=True, encoder=DjangoJSONEncoder)
+    analysis = models.JSONField(
+        null=True, blank=True, encoder=DjangoJSONEncoder)
+    details = models.JSONField(
+        null=True, blank=True, encoder=DjangoJSONEncoder)
+    generated_on = models.DateTimeField(null=True, blank=True)
+
+    objects = ReportSnapshotQuerySet.as_manager()
+
+    class Meta(AbstractBaseModel.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=['company', 'piller', 'filter_key'], 
+                name='unique_report_snapshot'
+            )
+        ]
+
+    def __str__(self) -> str:
+        """
+        Returns a string representation of the report snapshot.
+
+        Returns:
+            str: The string representation of the report snapshot.
+        """
+        return f"{self.company} - {self.piller} - {self.filters}"
@@ -0,0 +1,115 @@
+import json
+from functools import lru_cache
+
+import numpy as np
+import shapely
+from django.conf import settings
+from shapely.geometry import shape
+
+from .constants import PROTECTED_AREA_RADIUS
+from .utils import buffer_geometries, calculate_geometry_areas
+
+
+@lru_cache(maxsize=1)
+def load_protected_areas(path):
+    """
+    Loads a WDPA extract and builds its spatial index, once per worker.
+
+    Args:
+        path (str): The path of a GeoJSON FeatureCollection of protected
+            area polygons, e.g. exported from the WDPA for the countries
+            of the farms.
+
+    Returns:
+        tuple: The STRtree and the array of protected area geometries it
+            indexes.
+    """
+    with open(path) as file:
+        features = json.load(file)["features"]
+    geometries = shapely.make_valid(np.array([
+        shape(feature["geometry"]) for feature in features
+        if feature.get("geometry")
+    ]))
+    return shapely.STRtree(geometries), geometries
+
+
+def get_protected_areas():
+    """
+    Returns the index of the WDPA extract set in settings.WDPA_FILE.
+
+    Returns:
+        tuple: The STRtree and the protected area geometries, or None if 
+            no extract is configured.
+    """
+    if not settings.WDPA_FILE:
+        return None
+    return load_protected_areas(settings.WDPA_FILE)
+
+
+def calculate_protected_areas(geo_jsons):
+    """
+    Calculates the protected area within many farm polygons at once.
+
+    The candidate protected areas of all farms are found with one STRtree
+    query, intersected with the farms in one vectorized call, and the 
+    intersections of each farm are merged so overlapping designations are 
+    only counted once.
+
+    Args:
+        geo_jsons (list): The geojson polygons of the farms.
+
+    Returns:
+        numpy.ndarray: The protected area within each farm in square 
+            kilometers, like the Earth Engine backend.
+
+    Raises:
+        ValueError: If no WDPA extract is configured.
+    """
+    index = get_protected_areas()
+    if not index:
+        raise ValueError("WDPA_FILE is not configured.")
+    tree, protected_areas = index
+    farms = np.array([shape(geo_json) for geo_json in geo_jsons])
+    farm_index, protected_index = tree.query(farms, predicate="intersects")
+
+    areas = np.zeros(len(farms))
+    if not len(farm_index):
+        return areas
+    intersections = shapely.intersection(
+        farms[farm_index], protected_areas[protected_index])
+
+    # Group the intersections by farm
+    order = np.argsort(farm_index, kind="stable")
+    intersecting, starts = np.unique(farm_index[order], return_index=True)
+    merged = [
+        shapely.union_all(group)
+        for group in np.split(intersections[order], starts[1:])
+    ]
+    areas[intersecting] = calculate_geometry_areas(merged)
+    return areas / 100
+
+
+def are_near_protected_areas(geo_jsons, distance=PROTECTED_AREA_RADIUS):
+    """
+    Checks which farms are within a distance of a protected area.
+
+    Args:
+        geo_jsons (list): The geojson polygons of the farms.
+        distance (float): The distance in meters.
+
+    Returns:
+        numpy.ndarray: True for each farm within the distance.
+
+    Raises:
+        ValueError: If no WDPA extract is configured.
+    """
+    index = get_protected_areas()
+    if not index:
+        raise ValueError("WDPA_FILE is not configured.")
+    tree, _ = index
+    farms = np.array([shape(geo_json) for geo_json in geo_jsons])
+    buffered = buffer_geometries(farms, distance)
+    farm_index, _ = tree.query(buffered, predicate="intersects")
+    near = np.zeros(len(farms), dtype=bool)
+    near[farm_index] = True
+    return near
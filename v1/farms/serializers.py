@@ -1,43 +1,85 @@
 from rest_framework import serializers as base_serializers
 
 from base import serializers
+from base.fields import HashidRelatedField, RawJSONField
 from v1.farms import tasks
-from v1.farms.models import Farm, FarmComment
-from v1.supply_chains.models.analysis import AnalysisQueue
+from v1.farms.models import Farm, FarmComment, FarmProperty
+from v1.supply_chains.constants import AnalysisPriority
 from v1.supply_chains.models.nodes import Farmer
 
 # from scripts import load_dummy_data
 
 
 
+class FarmListSerializer(base_serializers.ListSerializer):
+    """
+    List serializer for bulk creating farms.
+    """
+
+    def create(self, validated_data):
+        """
+        Create the farms, derive their geometry properties in one batch and 
+        queue them for analysis on the background lane.
+
+        Args:
+            validated_data (list): The validated data of each Farm.
+
+        Returns:
+            list: The newly created Farm instances.
+        """
+        instances = [
+            self.child.create(attrs, bulk=True) for attrs in validated_data
+        ]
+        FarmProperty.objects.update_geometry(instances)
+        tasks.queue_analysis(instances, AnalysisPriority.BACKGROUND)
+        return instances
+
+
 class FarmSerializer(serializers.IDModelSerializer):
     """
     Serializer class for the Farm model.
     """
-    farmer = base_serializers.PrimaryKeyRelatedField(
+    farmer = HashidRelatedField(
         queryset=Farmer.objects.all(), required=False)
+    geo_json = RawJSONField(
+        raw_source='geo_json_text', required=False, allow_null=True)
 
     class Meta:
         model = Farm
         fields = '__all__'
+        list_serializer_class = FarmListSerializer
 
-    def create(self, validated_data):
+    def create(self, validated_data, bulk=False):
         """
         Create a new Farm instance.
 
+        The area, centroid and bounding box of the farm are derived from its 
+        geo_json right away, the raster metrics are computed by an analysis 
+        task on the interactive lane started once the request commits.
+
         Args:
             validated_data (dict): The validated data for creating the Farm.
+            bulk (bool): Created by the list serializer, which derives the 
+                geometry properties and queues the analysis of all farms at
+                once.
 
         Returns:
             Farm: The newly created Farm instance.
         """
         instance = super().create(validated_data)
-        AnalysisQueue.objects.create(farm=instance)
+        if not bulk:
+            FarmProperty.objects.update_geometry([instance])
+            tasks.queue_analysis([instance], AnalysisPriority.INTERACTIVE)
         return instance
     
     def update(self, instance, validated_data):
+        """
+        Update a Farm instance and queue it on the interactive analysis 
+        lane, a user editing a farm waits for the result.
+        """
         instance = super().update(instance, validated_data)
-        AnalysisQueue.objects.create(farm=instance)
+        FarmProperty.objects.update_geometry([instance])
+        tasks.queue_analysis([instance], AnalysisPriority.INTERACTIVE)
         return instance
 
 
@@ -1,20 +1,48 @@
+import importlib
+import threading
 import time
-from contextlib import contextmanager
-from hashlib import md5
+from datetime import timedelta
 from typing import Union
 
 from celery import shared_task
 from django.apps import apps
+from django.conf import settings
 from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
 from sentry_sdk import capture_exception, capture_message
 
-from v1.farms.earth_engine import ForestAnalyzer
+from v1.farms.constants import DETAIL_PAGE_SIZE, TreeCoverLossStandard
+from v1.farms.constants import HANSEN_LEGACY_DATASET, template_files
+from v1.farms.backends import BaseForestAnalyzer, TransientAnalysisError
+from v1.farms.backends import get_analyzer_class
+from v1.farms.earth_engine import calculate_loss_years_batch
+from v1.farms import metrics
+from v1.farms.managers import FarmFilter
 from v1.farms.models import Farm, YearlyTreeCoverLoss, FarmProperty
-from v1.farms.utils import is_polygon_valid
+from v1.farms.models import ReportSnapshot
+from v1.farms.protected_areas import are_near_protected_areas
+from v1.farms.protected_areas import calculate_protected_areas
+from v1.farms.utils import get_dataset_loss_year, is_polygon_valid
 from v1.supply_chains import constants as suply_constants
 from v1.supply_chains.models.analysis import AnalysisQueue
 
-LOCK_EXPIRE = 60 * 60 * 24  # Lock expires in 1 day
+SNAPSHOT_LOCK_EXPIRE = 60 * 5  # Wait 5 minutes before requesting again
+REPORT_REFRESH_WINDOW = 30  # Changes within it share a snapshot refresh
+DATASET_MIGRATION_BATCH_SIZE = 500  # Farms per Earth Engine call
+PROTECTED_AREA_BATCH_SIZE = 5000  # Farms per protected area index query
+ANALYSIS_RETRY_DELAY = 60 * 5  # First retry of a temporary failure, doubled
+ANALYSIS_CLAIM_SIZE = 100  # Queue entries claimed by a worker at a time
+ANALYSIS_LEASE_DURATION = 60 * 10  # Claim of a worker, renewed while working
+ANALYSIS_FARM_TIMEOUT = 60 * 60  # Leases of a worker stuck on a farm expire
+ANALYSIS_DISPATCH_WINDOW = 2  # Farms queued within it share an analysis task
+
+# (canopy density, radius) pairs the yearly tree cover loss is computed for,
+# the unbuffered farm at both densities and the radius of each standard
+LOSS_ANALYSES = sorted({(30, 0), (10, 0)} | {
+    (filters["canopy_density"], filters["radius"])
+    for filters in FarmFilter.values()
+})
 
 @shared_task(name="create_farm_properties")
 def create_farm_properties(farm_id: Union[int, None] = None):
@@ -35,16 +63,22 @@ def create_farm_properties(farm_id: Union[int, None] = None):
         if "geometry" in farm.geo_json and is_polygon_valid(
             farm.geo_json["geometry"]):
 
-            # Create a ForestAnalyzer object with the farm's geometry
-            analyzer = ForestAnalyzer(geo_json=farm.geo_json["geometry"])
+            # Create an analyzer object with the farm's geometry
+            analyzer = get_analyzer_class()(
+                geo_json=farm.geo_json["geometry"])
+
+            # The geometry properties are derived locally, only the raster 
+            # metrics come from the analyzer
+            FarmProperty.objects.update_geometry([farm])
 
             # Prepare the data for creating the FarmProperty object
             data = {
                 "farm": farm,
-                "total_area": analyzer.calculate_area(farm.geo_json['geometry']),
                 "primary_forest_area": analyzer.calculate_primary_forest(),
                 "tree_cover_extent": analyzer.calculate_tree_cover(),
-                "protected_area": analyzer.calculate_protected_area()
+                "protected_area": analyzer.calculate_protected_area(),
+                "near_protected_area": analyzer.is_near_protected_area(),
+                "dataset_version": analyzer.dataset
             }
             
             # Create FarmProperty object
@@ -73,75 +107,508 @@ def create_yearly_tree_cover_loss(farm_id: Union[int, None] = None):
         if "geometry" in farm.geo_json and is_polygon_valid(
             farm.geo_json['geometry']):
             
-            # Create a ForestAnalyzer object with the farm's geometry
-            analyzer_10 = ForestAnalyzer(
-                geo_json=farm.geo_json['geometry'], canopy_dens=10)
-            analyzer_30 = ForestAnalyzer(geo_json=farm.geo_json['geometry'])
-
-            # Calculate yearly tree cover loss for both canopy densities
-            year_data_30 = analyzer_30.calculate_yearly_tree_cover_loss()
-            year_data_10 = analyzer_10.calculate_yearly_tree_cover_loss()
-
-            # Create loss events for both canopy densities
-            for year, value in year_data_30.items():
-                YearlyTreeCoverLoss.objects.update_or_create(
-                    farm=farm, year=year, canopy_density=30, 
-                    defaults={'value':value}
-                )
-            for year, value in year_data_10.items():
-                YearlyTreeCoverLoss.objects.update_or_create(
-                    farm=farm, year=year, canopy_density=10, 
-                    defaults={'value':value}
-                )
+            # Calculate the yearly tree cover loss for every canopy density
+            # and radius, the farm polygon itself and the buffered radii
+            Analyzer = get_analyzer_class()
+            for canopy_dens, radius in LOSS_ANALYSES:
+                analyzer = Analyzer(
+                    geo_json=farm.geo_json['geometry'], buffer_area=radius,
+                    canopy_dens=canopy_dens)
+                year_data = analyzer.calculate_yearly_tree_cover_loss()
+
+                # Create loss events
+                for year, value in year_data.items():
+                    YearlyTreeCoverLoss.objects.update_or_create(
+                        farm=farm, year=year, canopy_density=canopy_dens, 
+                        radius=radius, 
+                        defaults={
+                            'value': value, 
+                            'dataset_version': analyzer.dataset
+                        }
+                    )
         else:
             capture_message(f"Invalid geo json for farm {farm.id}")
     return True
 
-@contextmanager
-def celery_task_lock(lock_id, oid):
-    timeout_at = time.monotonic() + LOCK_EXPIRE - 3
-    # cache.add fails if the key already exists
-    status = cache.add(lock_id, oid, LOCK_EXPIRE)
-    try:
-        yield status
-    finally:
-        # cache delete is very slow, but we have to use it to take
-        # advantage of using add() for atomic locking
-        if time.monotonic() < timeout_at and status:
-            # don't release the lock if we exceeded the timeout
-            # to lessen the chance of releasing an expired lock
-            # owned by someone else
-            # also don't release the lock if we didn't acquire it
-            cache.delete(lock_id)
-
-
-@shared_task(bind=True, name="daily_analysis_sync")
-def analysis_sync(self):
-    hexdigest = md5(self.__name__.encode("utf-8")).hexdigest()
-    lock_id = "{0}-lock".format(hexdigest)
-    with celery_task_lock(lock_id, self.app.oid) as acquired:
-        if acquired:
-            # capture_message(f"Driver ID syncing started in 
-            # {settings.ENVIRONMENT}")
-            sync_ids = AnalysisQueue.objects.filter(
-                status=suply_constants.SyncStatus.IN_QUEUE
-            ).values_list("farm__id", "id")
-            for farm_id, id in sync_ids:
-                AnalysisQueue.objects.filter(id=id).update(
-                    status=suply_constants.SyncStatus.STARTED)
+def group_analysis_queue(sync_ids, Analyzer):
+    """
+    Groups analysis queue entries into the batches of the analyzer.
+
+    Entries are bucketed by `Analyzer.get_batch_key`, e.g. the raster tile
+    of the farm for the local backend, so the farms of a bucket can be
+    analysed together. Entries without a valid geometry are put in their
+    own bucket, their tasks only report the invalid geometry.
+
+    Args:
+        sync_ids (iterable): (farm id, queue id, farm geo_json, *fields) 
+            tuples.
+        Analyzer (Type[BaseForestAnalyzer]): The analyzer class.
+
+    Returns:
+        list: (geometries, [(farm id, queue id, *fields), ...]) tuples, one 
+            per batch.
+    """
+    batches = {}
+    for farm_id, id, geo_json, *fields in sync_ids:
+        geometry = (geo_json or {}).get("geometry")
+        key = None
+        if geometry and is_polygon_valid(geometry):
+            try:
+                key = Analyzer.get_batch_key(geometry)
+            except (KeyError, IndexError, TypeError, ValueError):
+                key = None
+        geometries, items = batches.setdefault(key, ([], []))
+        if key is not None:
+            geometries.append(geometry)
+        items.append((farm_id, id, *fields))
+    return list(batches.values())
+
+
+class LeaseHeartbeat(threading.Thread):
+    """
+    Renews the leases of the claimed queue entries still to be analysed 
+    every third of the lease duration, from a thread of its own.
+
+    The renewal does not wait for the analysis of a farm to finish, so a 
+    farm whose Earth Engine calls and retries outlast the lease is not 
+    handed to another worker. Once a single farm takes longer than 
+    ANALYSIS_FARM_TIMEOUT the leases are no longer renewed, so the entries 
+    of a hung worker are still released.
+
+    Use it as a context manager around the analysis of the claimed entries.
+    """
+
+    def __init__(self, ids, lease_duration):
+        """
+        Constructor of the heartbeat.
+
+        Args:
+            ids (list): The ids of the claimed AnalysisQueue entries.
+            lease_duration (timedelta): The duration of the leases.
+        """
+        super().__init__(daemon=True)
+        self.pending = set(ids)
+        self.lease_duration = lease_duration
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.farm_started = time.monotonic()
+
+    def done(self, id):
+        """
+        Stops renewing the lease of an analysed entry.
+
+        Args:
+            id: The id of the AnalysisQueue entry.
+        """
+        with self.lock:
+            self.pending.discard(id)
+        self.farm_started = time.monotonic()
+
+    def run(self):
+        """Renews the leases until the heartbeat is stopped."""
+        interval = self.lease_duration.total_seconds() / 3
+        try:
+            while not self.stopped.wait(interval):
+                farm_duration = time.monotonic() - self.farm_started
+                if farm_duration > ANALYSIS_FARM_TIMEOUT:
+                    continue
+                with self.lock:
+                    ids = list(self.pending)
+                if not ids:
+                    continue
                 try:
-                    if farm_id:
-                        create_farm_properties(farm_id)
-                        create_yearly_tree_cover_loss(farm_id)
-                    AnalysisQueue.objects.filter(id=id).update(
-                        status=suply_constants.SyncStatus.COMPLETED)
-                except Exception as e:
+                    AnalysisQueue.objects.renew_leases(
+                        ids, self.lease_duration)
+                except DatabaseError as e:
                     capture_exception(e)
-                    AnalysisQueue.objects.filter(id=id).update(
-                        status=suply_constants.SyncStatus.FAILED)
+        finally:
+            connection.close()
 
-            return True
-        else:
-            capture_message(
-                f"{self.__name__} : Celery waiting for the previous task to \
-                be complete.")
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stopped.set()
+        self.join()
+
+
+def handle_analysis_failure(queue_id, attempts, error):
+    """
+    Records the failed analysis of a queue entry.
+
+    Temporary backend errors, e.g. Earth Engine rate limits that outlasted 
+    the request retries, put the entry back in the queue with an 
+    exponentially growing delay. After settings.ANALYSIS_MAX_ATTEMPTS 
+    attempts the entry is moved to the dead letter state. Other errors fail
+    the entry right away.
+
+    Args:
+        queue_id: The id of the AnalysisQueue entry.
+        attempts (int): The failed attempts of the entry so far.
+        error (Exception): The error.
+    """
+    capture_exception(error)
+    attempts += 1
+    next_attempt_on = None
+    if not isinstance(error, TransientAnalysisError):
+        status = suply_constants.SyncStatus.FAILED
+    elif attempts >= settings.ANALYSIS_MAX_ATTEMPTS:
+        status = suply_constants.SyncStatus.DEAD_LETTER
+    else:
+        status = suply_constants.SyncStatus.IN_QUEUE
+        next_attempt_on = timezone.now() + timedelta(
+            seconds=ANALYSIS_RETRY_DELAY * 2 ** (attempts - 1))
+    AnalysisQueue.objects.filter(id=queue_id).update(
+        status=status, attempts=attempts, next_attempt_on=next_attempt_on,
+        lease_expires_on=None)
+    metrics.ANALYSED_FARMS.labels(status.name.lower()).inc()
+
+
+@shared_task(name="daily_analysis_sync")
+def analysis_sync(min_priority: Union[int, None] = None):
+    """
+    Analyses the queued farms.
+
+    Entries are claimed in chunks of ANALYSIS_CLAIM_SIZE with a lease, 
+    skipping entries locked by other workers, so any number of workers can 
+    drain the queue together. The lease of the entries still to be analysed
+    is renewed by a `LeaseHeartbeat` while the chunk is worked on, and 
+    entries of a worker that died or hung are returned to the queue by 
+    `release_expired_analysis_leases` once their lease expires.
+
+    Every chunk is claimed from the highest priority with due entries, 
+    shared fairly among companies, see `AnalysisQueueQuerySet.claim`. The 
+    task runs on the background lane, `interactive_analysis_sync` on the 
+    interactive lane.
+
+    Args:
+        min_priority (int, optional): Only analyse entries of this priority
+            or higher.
+    """
+    Analyzer = get_analyzer_class()
+    lease_duration = timedelta(seconds=ANALYSIS_LEASE_DURATION)
+    analysed_farm_ids = []
+    while True:
+        ids = AnalysisQueue.objects.claim(
+            ANALYSIS_CLAIM_SIZE, lease_duration, min_priority)
+        if not ids:
+            break
+        sync_ids = AnalysisQueue.objects.filter(id__in=ids).values_list(
+            "farm__id", "id", "farm__geo_json", "attempts")
+        with LeaseHeartbeat(ids, lease_duration) as heartbeat:
+            for geo_jsons, items in group_analysis_queue(sync_ids, Analyzer):
+                with Analyzer.batch(geo_jsons):
+                    for farm_id, id, attempts in items:
+                        try:
+                            with metrics.ANALYSIS_SECONDS.time():
+                                if farm_id:
+                                    create_farm_properties(farm_id)
+                                    create_yearly_tree_cover_loss(farm_id)
+                            AnalysisQueue.objects.filter(id=id).update(
+                                status=suply_constants.SyncStatus.COMPLETED,
+                                lease_expires_on=None)
+                            metrics.ANALYSED_FARMS.labels("completed").inc()
+                        except Exception as e:
+                            handle_analysis_failure(id, attempts, e)
+                        analysed_farm_ids.append(farm_id)
+                        heartbeat.done(id)
+
+    refresh_company_report_snapshots(
+        Farm.objects.filter(id__in=analysed_farm_ids).values_list(
+            "farmer__company_id", flat=True))
+    return True
+
+
+@shared_task(name="interactive_analysis_sync")
+def interactive_analysis_sync():
+    """
+    Analyses the farms queued by interactive edits. The task is routed to 
+    its own Celery queue, so its workers are never busy with bulk imports.
+    """
+    return analysis_sync(suply_constants.AnalysisPriority.INTERACTIVE)
+
+
+def queue_analysis(farms, priority):
+    """
+    Queues farms for analysis and starts the analysis of their lane once 
+    the transaction commits.
+
+    Farms queued within ANALYSIS_DISPATCH_WINDOW seconds of each other are 
+    analysed by the same task: the first dispatch of a window starts the 
+    task with the window as countdown, the following ones only find the 
+    dispatch marker in the cache. The hourly `daily_analysis_sync` sweeps 
+    up whatever a lost dispatch left in the queue.
+
+    Args:
+        farms (list): The Farm instances.
+        priority (int): The analysis lane, an AnalysisPriority.
+    """
+    AnalysisQueue.objects.bulk_create([
+        AnalysisQueue(farm=farm, priority=priority) for farm in farms])
+    transaction.on_commit(lambda: dispatch_analysis(priority))
+
+
+def dispatch_analysis(priority):
+    """
+    Starts the analysis task of a lane, unless one was started within 
+    ANALYSIS_DISPATCH_WINDOW seconds and has not begun claiming yet.
+
+    Args:
+        priority (int): The analysis lane, an AnalysisPriority.
+    """
+    lock_id = f"analysis-dispatch-{priority}"
+    if not cache.add(lock_id, True, ANALYSIS_DISPATCH_WINDOW):
+        return
+    if priority >= suply_constants.AnalysisPriority.INTERACTIVE:
+        task = interactive_analysis_sync
+    else:
+        task = analysis_sync
+    task.apply_async(countdown=ANALYSIS_DISPATCH_WINDOW)
+
+
+@shared_task(name="release_expired_analysis_leases")
+def release_expired_analysis_leases():
+    """
+    Returns the analysis queue entries of workers that died or hung, i.e. 
+    STARTED entries whose lease expired, to the queue.
+    """
+    return AnalysisQueue.objects.release_expired()
+
+
+@shared_task(name="generate_report_snapshot")
+def generate_report_snapshot(company_id, piller, filters=None):
+    """
+    Generates the report snapshot of a company for a filter set.
+
+    Runs the piller's stats, analysis and analysis detail templates on the 
+    filtered farms and stores their outputs, so the endpoints can serve them 
+    without recomputing.
+
+    Args:
+        company_id (str): The id of the company.
+        piller (str): The piller of the report.
+        filters (dict, optional): The farm filters of the report.
+    """
+    filters = ReportSnapshot.objects.clean_filters(filters or {})
+    queryset = Farm.objects.filter_by_kwargs(filters).filter(
+        farmer__company_id=company_id)
+    proccessor = importlib.import_module(template_files[piller])
+    details = {
+        method: proccessor.analysis_detail.get_data(
+            queryset, method, method, limit=DETAIL_PAGE_SIZE)
+        for method in TreeCoverLossStandard.labels
+    }
+    ReportSnapshot.objects.update_or_create(
+        company_id=company_id, piller=piller, 
+        filter_key=ReportSnapshot.objects.get_filter_key(filters),
+        defaults={
+            "filters": filters,
+            "stats": proccessor.stats.get_data(queryset),
+            "analysis": proccessor.analysis.get_data(queryset),
+            "details": details,
+            "generated_on": timezone.now(),
+        }
+    )
+    return True
+
+
+def request_report_snapshot(company, piller, kwargs):
+    """
+    Queues the generation of a report snapshot for the request filters.
+
+    Repeated requests for the same snapshot within SNAPSHOT_LOCK_EXPIRE 
+    are ignored, so a burst of requests only queues one task.
+
+    Args:
+        company (Company): The company of the report.
+        piller (str): The piller of the report.
+        kwargs: The query parameters of the request.
+    """
+    filters = ReportSnapshot.objects.clean_filters(kwargs)
+    filter_key = ReportSnapshot.objects.get_filter_key(filters)
+    lock_id = f"report-snapshot-{company.id}-{piller}-{filter_key}"
+    if cache.add(lock_id, True, SNAPSHOT_LOCK_EXPIRE):
+        generate_report_snapshot.delay(str(company.id), piller, filters)
+
+
+def refresh_company_report_snapshots(company_ids):
+    """
+    Queues the regeneration of the existing snapshots of the companies.
+
+    Called when the analysis of farms completes or fails, so only the 
+    reports of companies owning the analysed farms are regenerated. Every 
+    cached filter set of those companies is recomputed in full, the report 
+    templates aggregate over all filtered farms and can not be updated 
+    farm by farm.
+
+    Args:
+        company_ids (iterable): The ids of the affected companies.
+    """
+    snapshots = ReportSnapshot.objects.filter(
+        company_id__in=set(company_ids)
+    ).values_list("company_id", "piller", "filters")
+    for company_id, piller, filters in snapshots:
+        generate_report_snapshot.delay(str(company_id), piller, filters)
+
+
+@shared_task(name="refresh_report_snapshots")
+def refresh_report_snapshots(company_id):
+    """
+    Regenerates the existing report snapshots of a company.
+
+    Args:
+        company_id (str): The id of the company.
+    """
+    refresh_company_report_snapshots([company_id])
+    return True
+
+
+def queue_report_refresh(company_ids):
+    """
+    Regenerates the report snapshots of the companies once the transaction
+    commits, after farms or comments were created, edited or deleted.
+
+    Changes of a company within REPORT_REFRESH_WINDOW seconds share one 
+    regeneration: the first change of a window starts the task with the 
+    window as countdown, the following ones only find the marker in the 
+    cache.
+
+    Args:
+        company_ids (iterable): The ids of the affected companies.
+    """
+    company_ids = {str(company_id) for company_id in company_ids}
+
+    def dispatch():
+        for company_id in company_ids:
+            lock_id = f"report-refresh-{company_id}"
+            if cache.add(lock_id, True, REPORT_REFRESH_WINDOW):
+                refresh_report_snapshots.apply_async(
+                    (company_id,), countdown=REPORT_REFRESH_WINDOW)
+
+    transaction.on_commit(dispatch)
+
+
+@shared_task(name="migrate_hansen_dataset")
+def migrate_hansen_dataset(dataset: Union[str, None] = None, 
+                           batch_size: int = DATASET_MIGRATION_BATCH_SIZE):
+    """
+    Brings the results of all farms up to a new Hansen dataset version.
+
+    Only the loss years added since the dataset each farm was analysed 
+    with are computed, in one Earth Engine call per batch of farms and 
+    analysis radius, and appended as YearlyTreeCoverLoss rows. Prior years 
+    are left untouched.
+
+    Args:
+        dataset (str, optional): The new dataset id, defaults to 
+            settings.HANSEN_DATASET.
+        batch_size (int): The number of farms per Earth Engine call.
+    """
+    dataset = dataset or settings.HANSEN_DATASET
+    last_year = get_dataset_loss_year(dataset)
+    properties = FarmProperty.objects.exclude(dataset_version=dataset)
+    versions = properties.order_by().values_list(
+        "dataset_version", flat=True).distinct()
+
+    for version in list(versions):
+        first_year = get_dataset_loss_year(
+            version or HANSEN_LEGACY_DATASET) + 1
+        years = list(range(first_year, last_year + 1))
+        farm_ids = list(properties.filter(
+            dataset_version=version).values_list("farm_id", flat=True))
+
+        for index in range(0, len(farm_ids), batch_size):
+            farms = Farm.objects.filter(
+                id__in=farm_ids[index:index + batch_size]
+            ).only("id", "geo_json")
+            geo_jsons = {
+                str(farm.id): farm.geo_json["geometry"] for farm in farms
+                if farm.geo_json and "geometry" in farm.geo_json 
+                and is_polygon_valid(farm.geo_json["geometry"])
+            }
+            if not geo_jsons:
+                continue
+            losses = []
+            try:
+                for radius in sorted({radius for _, radius in LOSS_ANALYSES}):
+                    if not years:
+                        break
+                    radius_geo_jsons = geo_jsons
+                    if radius:
+                        radius_geo_jsons = dict(zip(
+                            geo_jsons, BaseForestAnalyzer.buffer_geo_jsons(
+                                list(geo_jsons.values()), radius)))
+                    data = calculate_loss_years_batch(
+                        radius_geo_jsons, years, dataset=dataset, 
+                        canopy_densities=tuple(
+                            canopy_dens for canopy_dens, analysis_radius 
+                            in LOSS_ANALYSES if analysis_radius == radius))
+                    losses += [
+                        YearlyTreeCoverLoss(
+                            farm_id=farm_id, year=year, 
+                            canopy_density=canopy_dens, radius=radius, 
+                            value=value, dataset_version=dataset)
+                        for farm_id, densities in data.items()
+                        for canopy_dens, yearly_data in densities.items()
+                        for year, value in yearly_data.items() if value
+                    ]
+            except Exception as e:
+                capture_exception(e)
+                continue
+            with transaction.atomic():
+                # Drop rows of an earlier, interrupted run of these years
+                YearlyTreeCoverLoss.objects.filter(
+                    farm_id__in=geo_jsons.keys(), year__in=years).delete()
+                YearlyTreeCoverLoss.objects.bulk_create(losses)
+                FarmProperty.objects.filter(
+                    farm_id__in=geo_jsons.keys()).update(
+                        dataset_version=dataset)
+    return True
+
+
+@shared_task(name="refresh_protected_areas")
+def refresh_protected_areas(batch_size: int = PROTECTED_AREA_BATCH_SIZE):
+    """
+    Recomputes the protected area results of all farms from the local WDPA
+    extract in settings.WDPA_FILE.
+
+    Run after the extract is updated. The farms are processed in batches, 
+    with one spatial index query per batch and no Earth Engine calls.
+
+    Args:
+        batch_size (int): The number of farms per batch.
+    """
+    properties = FarmProperty.objects.exclude(farm__geo_json=None).only(
+        "id", "farm__geo_json").select_related("farm").order_by("pk")
+    last_pk = None
+    while True:
+        batch = properties
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        batch = list(batch[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        farm_properties, geo_jsons = [], []
+        for farm_property in batch:
+            geo_json = farm_property.farm.geo_json
+            if "geometry" not in geo_json or not is_polygon_valid(
+                geo_json["geometry"]):
+                continue
+            try:
+                geo_jsons.append(BaseForestAnalyzer.to_polygon_geo_json(
+                    geo_json["geometry"]))
+            except ValueError:
+                continue
+            farm_properties.append(farm_property)
+        if not geo_jsons:
+            continue
+        areas = calculate_protected_areas(geo_jsons)
+        near = are_near_protected_areas(geo_jsons)
+        for farm_property, area, is_near in zip(farm_properties, areas, near):
+            farm_property.protected_area = float(area)
+            farm_property.near_protected_area = bool(is_near)
+        FarmProperty.objects.bulk_update(
+            farm_properties, ["protected_area", "near_protected_area"])
+    return True
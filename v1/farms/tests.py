@@ -1,3 +1,84 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from base.rate_limit import TokenBucket
+from v1.farms import earth_engine
+from v1.farms.backends import TransientAnalysisError
+
+
+class HttpError(Exception):
+    """An error of the Earth Engine HTTP client, with the response."""
+
+    def __init__(self, status, message=""):
+        super().__init__(message)
+        self.resp = mock.Mock(status=status)
+
+
+class IsTransientErrorTest(SimpleTestCase):
+    """Tests the classification of the Earth Engine errors."""
+
+    def test_rate_limit_is_transient(self):
+        self.assertTrue(earth_engine.is_transient_error(HttpError(429)))
+        self.assertTrue(earth_engine.is_transient_error(
+            Exception("<HttpError 429 Too Many Requests>")))
+        self.assertTrue(earth_engine.is_transient_error(
+            Exception("Too many concurrent aggregations.")))
+
+    def test_server_errors_are_transient(self):
+        for status in (500, 502, 503, 504):
+            self.assertTrue(earth_engine.is_transient_error(HttpError(status)))
+            self.assertTrue(earth_engine.is_transient_error(
+                Exception(f"<HttpError {status} when requesting ...>")))
+        self.assertTrue(earth_engine.is_transient_error(
+            Exception("Computation timed out.")))
+
+    def test_bad_request_is_permanent(self):
+        self.assertFalse(earth_engine.is_transient_error(HttpError(400)))
+        self.assertFalse(earth_engine.is_transient_error(
+            HttpError(400, "Quota of the project is not enabled")))
+        self.assertFalse(earth_engine.is_transient_error(
+            Exception("<HttpError 400 ... quota exceeded in request>")))
+        self.assertFalse(earth_engine.is_transient_error(
+            Exception("Geometry.polygon: Invalid geometry.")))
+
+    def test_connection_errors_are_transient(self):
+        self.assertTrue(earth_engine.is_transient_error(ConnectionError()))
+        self.assertTrue(earth_engine.is_transient_error(
+            ConnectionResetError()))
+        self.assertTrue(earth_engine.is_transient_error(TimeoutError()))
+
+
+@override_settings(EE_MAX_RETRIES=3, EE_BACKOFF_BASE=0, EE_BACKOFF_MAX=0)
+@mock.patch.object(TokenBucket, "acquire")
+class GetInfoTest(SimpleTestCase):
+    """Tests the retries of the Earth Engine requests."""
+
+    def test_returns_the_value(self, acquire):
+        computed_object = mock.Mock()
+        computed_object.getInfo.return_value = 42
+        self.assertEqual(earth_engine.get_info(computed_object), 42)
+        self.assertEqual(acquire.call_count, 1)
+
+    def test_retries_transient_errors(self, acquire):
+        computed_object = mock.Mock()
+        computed_object.getInfo.side_effect = [
+            HttpError(503), ConnectionError(), 42]
+        self.assertEqual(earth_engine.get_info(computed_object), 42)
+        self.assertEqual(computed_object.getInfo.call_count, 3)
+        self.assertEqual(acquire.call_count, 3)
+
+    def test_raises_transient_error_after_retries(self, acquire):
+        computed_object = mock.Mock()
+        computed_object.getInfo.side_effect = HttpError(429)
+        with self.assertRaises(TransientAnalysisError):
+            earth_engine.get_info(computed_object)
+        self.assertEqual(computed_object.getInfo.call_count, 4)
+        self.assertEqual(acquire.call_count, 4)
+
+    def test_does_not_retry_permanent_errors(self, acquire):
+        computed_object = mock.Mock()
+        computed_object.getInfo.side_effect = HttpError(400, "quota")
+        with self.assertRaises(HttpError):
+            earth_engine.get_info(computed_object)
+        self.assertEqual(computed_object.getInfo.call_count, 1)
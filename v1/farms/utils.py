@@ -1,8 +1,215 @@
 import math
+import re
+from functools import lru_cache
 
+import numpy as np
+import shapely
 from pyproj import Transformer
-from shapely.geometry import Polygon, mapping
-from shapely.ops import transform
+from shapely.geometry import Polygon, mapping, shape
+
+
+# Cylindrical equal-area projection of the WGS84 ellipsoid, areas of planar
+# polygons in it are their true areas on the ellipsoid
+EQUAL_AREA_CRS = "+proj=cea +datum=WGS84 +units=m"
+
+# Vertices of a regular hexagon with a radius of 1, at 0°, 60°, ... 300°
+UNIT_HEXAGON = np.array([
+    (math.cos(math.radians(60 * i)), math.sin(math.radians(60 * i)))
+    for i in range(6)
+])
+
+
+@lru_cache(maxsize=None)
+def get_transformer(from_crs, to_crs):
+    """
+    Returns a cached transformer between two coordinate reference systems.
+
+    Building a transformer loads the projection database, which costs far
+    more than transforming a few coordinates, so transformers are created
+    once per worker and reused.
+
+    Args:
+        from_crs (str): The source CRS, e.g. 'epsg:4326'.
+        to_crs (str): The target CRS.
+
+    Returns:
+        pyproj.Transformer: The transformer, with x/y in lon/lat order.
+    """
+    return Transformer.from_crs(from_crs, to_crs, always_xy=True)
+
+
+def get_utm_epsg(longitude, latitude):
+    """
+    Returns the EPSG code of the WGS84 UTM zone containing a coordinate.
+
+    Args:
+        longitude (float or numpy.ndarray): The longitude.
+        latitude (float or numpy.ndarray): The latitude.
+
+    Returns:
+        int or numpy.ndarray: The EPSG code, e.g. 32628 for zone 28N.
+    """
+    zone = np.clip(np.floor((np.add(longitude, 180)) / 6) + 1, 1, 60)
+    return (np.where(np.less(latitude, 0), 32700, 32600) + zone).astype(int)
+
+
+def calculate_areas(geo_jsons):
+    """
+    Calculates the area in hectares of many geojson polygons at once.
+
+    The vertices of all polygons are projected to a cylindrical equal-area
+    projection in one call and the area of every ring is computed with the
+    shoelace formula over the concatenated vertices, so the areas are true 
+    areas on the WGS84 ellipsoid wherever the farms are. Holes are 
+    subtracted from their polygons.
+
+    Args:
+        geo_jsons (list): The geojson geometries. Polygons and
+            MultiPolygons have an area, other geometries have 0.
+
+    Returns:
+        numpy.ndarray: The areas in hectares, in the order of the geometries.
+    """
+    rings, owners, signs = [], [], []
+    for index, geo_json in enumerate(geo_jsons):
+        if geo_json["type"] == "Polygon":
+            polygons = [geo_json["coordinates"]]
+        elif geo_json["type"] == "MultiPolygon":
+            polygons = geo_json["coordinates"]
+        else:
+            continue
+        for polygon in polygons:
+            for ring_index, ring in enumerate(polygon):
+                if len(ring) < 3:
+                    continue
+                rings.append(np.asarray(ring, dtype=float)[:, :2])
+                owners.append(index)
+                signs.append(-1 if ring_index else 1)
+
+    areas = np.zeros(len(geo_jsons))
+    if not rings:
+        return areas
+    lengths = np.array([len(ring) for ring in rings])
+    coordinates = np.concatenate(rings)
+    x, y = get_transformer("epsg:4326", EQUAL_AREA_CRS).transform(
+        coordinates[:, 0], coordinates[:, 1])
+
+    # Index of the next vertex of each vertex, wrapping around its ring
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    following = np.arange(len(coordinates)) + 1
+    following[starts + lengths - 1] = starts
+    cross = x * y[following] - x[following] * y
+    ring_areas = np.abs(np.add.reduceat(cross, starts)) / 2
+
+    np.add.at(areas, owners, ring_areas * signs)
+    return areas / 10000
+
+
+def calculate_area(geo_json):
+    """
+    Calculates the area in hectares of a geojson polygon.
+
+    Args:
+        geo_json (dict): The geojson geometry.
+
+    Returns:
+        float: The area in hectares.
+    """
+    return float(calculate_areas([geo_json])[0])
+
+
+def _transform_geometries(geometries, from_crs, to_crs):
+    """
+    Transforms an array of shapely geometries with a single call of a
+    cached transformer.
+    """
+    transformer = get_transformer(from_crs, to_crs)
+    return shapely.transform(
+        geometries,
+        lambda coordinates: np.column_stack(
+            transformer.transform(coordinates[:, 0], coordinates[:, 1])))
+
+
+def calculate_geometry_areas(geometries):
+    """
+    Calculates the area in hectares of an array of shapely geometries.
+
+    Like `calculate_areas`, but for shapely geometries of any type, e.g. 
+    the results of intersections. Lines and points have no area.
+
+    Args:
+        geometries (numpy.ndarray): The geometries in lat/lon.
+
+    Returns:
+        numpy.ndarray: The areas in hectares.
+    """
+    projected = _transform_geometries(
+        np.asarray(geometries, dtype=object), "epsg:4326", EQUAL_AREA_CRS)
+    return shapely.area(projected) / 10000
+
+
+def buffer_geometries(geometries, distance):
+    """
+    Buffers an array of lat/lon shapely geometries by a distance in meters.
+
+    The geometries are buffered in the UTM zone of their centroid, with one
+    vectorized shapely `buffer` call and one transform call each way per
+    zone.
+
+    Args:
+        geometries (numpy.ndarray): The geometries in lat/lon.
+        distance (float or numpy.ndarray): The buffer distance in meters,
+            for all geometries or per geometry.
+
+    Returns:
+        numpy.ndarray: The buffered geometries in lat/lon.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    distance = np.broadcast_to(distance, geometries.shape)
+    buffered = np.empty(geometries.shape, dtype=object)
+    centroids = shapely.centroid(geometries)
+    epsg_codes = get_utm_epsg(
+        shapely.get_x(centroids), shapely.get_y(centroids))
+    for epsg_code in np.unique(epsg_codes):
+        selected = epsg_codes == epsg_code
+        utm_crs = f"epsg:{epsg_code}"
+        projected = _transform_geometries(
+            geometries[selected], "epsg:4326", utm_crs)
+        buffered[selected] = _transform_geometries(
+            shapely.buffer(projected, distance[selected]), utm_crs, 
+            "epsg:4326")
+    return buffered
+
+
+def get_geometry_properties(geo_jsons):
+    """
+    Derives the area, centroid and bounding box of many geojson geometries.
+
+    Args:
+        geo_jsons (list): The geojson geometries.
+
+    Returns:
+        list: Dictionaries with the 'total_area' in hectares, the
+            'centroid_latitude', 'centroid_longitude' and the 'bbox' as
+            [min lon, min lat, max lon, max lat], in the order of the
+            geometries.
+    """
+    if not geo_jsons:
+        return []
+    geometries = np.array([shape(geo_json) for geo_json in geo_jsons])
+    centroids = shapely.centroid(geometries)
+    bounds = shapely.bounds(geometries)
+    return [
+        {
+            "total_area": float(area),
+            "centroid_latitude": lat,
+            "centroid_longitude": lon,
+            "bbox": bbox,
+        }
+        for area, lon, lat, bbox in zip(
+            calculate_areas(geo_jsons), shapely.get_x(centroids).tolist(),
+            shapely.get_y(centroids).tolist(), bounds.tolist())
+    ]
 
 
 class HexagonUtils:
@@ -11,22 +218,64 @@ class HexagonUtils:
         Calculate the radius of a hexagon based on its area.
 
         Args:
-            area_in_ha (float): Area of the hexagon in hectares (1 hectare = 10,000 square meters).
+            area_in_ha (float or numpy.ndarray): Area of the hexagon in hectares (1 hectare = 10,000 square meters).
 
         Returns:
-            float: The radius of the hexagon in meters.
+            float or numpy.ndarray: The radius of the hexagon in meters.
         """
         # Convert the area from hectares to square meters
-        area_in_sqm = area_in_ha * 10000
+        area_in_sqm = np.multiply(area_in_ha, 10000)
 
         # The formula for the area of a regular hexagon is:
         # (3 * sqrt(3) / 2) * r^2
         # Rearrange to solve for r:
         # r = sqrt((2 * area) / (3 * sqrt(3)))
-        radius = math.sqrt((2 * area_in_sqm) / (3 * math.sqrt(3)))
+        radius = np.sqrt((2 * area_in_sqm) / (3 * math.sqrt(3)))
 
         return radius
 
+    def create_hexagons(self, latitudes, longitudes, area_in_ha=0.25):
+        """
+        Create hexagons centered at many coordinates at once.
+
+        The unit hexagon is scaled by the radius of each hexagon and moved to
+        its center in the UTM zone of the center, and the vertices of all 
+        hexagons of a zone are transformed back to lat/lon in a single call.
+
+        Args:
+            latitudes (array-like): Latitudes of the center points.
+            longitudes (array-like): Longitudes of the center points.
+            area_in_ha (float or array-like, optional): Desired area of the hexagons in hectares. Defaults to 0.25 ha.
+
+        Returns:
+            numpy.ndarray: The closed hexagon rings in lon/lat, with the shape (number of points, 7, 2).
+        """
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        radius = np.broadcast_to(
+            self.calculate_hex_radius(area_in_ha), latitudes.shape)
+
+        # Close the rings by repeating the first vertex
+        ring = np.vstack([UNIT_HEXAGON, UNIT_HEXAGON[:1]])
+        hex_lon = np.empty(latitudes.shape + (len(ring),))
+        hex_lat = np.empty(latitudes.shape + (len(ring),))
+
+        # Draw the hexagons in the UTM zone of their center, one transform
+        # call per zone and direction
+        epsg_codes = get_utm_epsg(longitudes, latitudes)
+        for epsg_code in np.unique(epsg_codes):
+            selected = epsg_codes == epsg_code
+            utm_crs = f"epsg:{epsg_code}"
+            x, y = get_transformer("epsg:4326", utm_crs).transform(
+                longitudes[selected], latitudes[selected])
+            hex_x = np.asarray(x)[:, None] + radius[selected, None] * ring[:, 0]
+            hex_y = np.asarray(y)[:, None] + radius[selected, None] * ring[:, 1]
+
+            # Convert the hexagons back to lat/lon (WGS84)
+            hex_lon[selected], hex_lat[selected] = get_transformer(
+                utm_crs, "epsg:4326").transform(hex_x, hex_y)
+        return np.stack([hex_lon, hex_lat], axis=-1)
+
     def create_hexagon(self, lat, lon, area_in_ha):
         """
         Create a hexagon centered at a given latitude and longitude with a specified area.
@@ -39,27 +288,7 @@ class HexagonUtils:
         Returns:
             shapely.geometry.Polygon: The hexagon as a polygon in lat/lon coordinates.
         """
-        # Calculate the radius needed for a hexagon with the given area
-        radius = self.calculate_hex_radius(area_in_ha)
-
-        # Set up transformers to switch between lat/lon (WGS84) and UTM (projected) coordinates
-        transformer_to_utm = Transformer.from_crs("epsg:4326", "epsg:32633", always_xy=True)
-        transformer_to_latlon = Transformer.from_crs("epsg:32633", "epsg:4326", always_xy=True)
-
-        # Convert the center lat/lon point to UTM coordinates for geometric calculations
-        utm_center = transformer_to_utm.transform(lon, lat)
-
-        # Create a hexagon in UTM coordinates centered at the UTM-transformed point
-        hexagon = Polygon([
-            (utm_center[0] + radius * math.cos(angle),  # X-coordinate
-             utm_center[1] + radius * math.sin(angle))  # Y-coordinate
-            for angle in [math.radians(60 * i) for i in range(6)]  # Divide 360° into 6 angles
-        ])
-
-        # Convert the hexagon from UTM back to lat/lon (WGS84)
-        hexagon_latlon = transform(transformer_to_latlon.transform, hexagon)
-
-        return hexagon_latlon
+        return Polygon(self.create_hexagons([lat], [lon], area_in_ha)[0])
 
     def polygon_to_geojson(self, polygon):
         """
@@ -94,6 +323,24 @@ class HexagonUtils:
 
         return geojson_output
 
+    def coords_to_polys(self, latitudes, longitudes, area_in_ha=0.25):
+        """
+        Create hexagonal polygons around many coordinates and return them as GeoJSON objects.
+
+        Args:
+            latitudes (array-like): Latitudes of the center points.
+            longitudes (array-like): Longitudes of the center points.
+            area_in_ha (float or array-like, optional): Desired area of the hexagons in hectares. Defaults to 0.25 ha.
+
+        Returns:
+            list: GeoJSON geometry representations of the hexagons, with the coordinates as lists.
+        """
+        hexagons = self.create_hexagons(latitudes, longitudes, area_in_ha)
+        return [
+            {"type": "Polygon", "coordinates": [ring]}
+            for ring in hexagons.tolist()
+        ]
+
 
 def is_polygon_valid(geo_json):
     """
@@ -108,4 +355,25 @@ def is_polygon_valid(geo_json):
 
     if geo_json["type"] == "Polygon" and not len(geo_json["coordinates"][0]):
         return False
-    return True
\ No newline at end of file
+    return True
+
+
+def get_dataset_loss_year(dataset):
+    """
+    Returns the last loss year covered by a Hansen Global Forest Change 
+    dataset.
+
+    Args:
+        dataset (str): The dataset id, e.g. 
+            'UMD/hansen/global_forest_change_2023_v1_11'.
+
+    Returns:
+        int: The last loss year, e.g. 2023.
+
+    Raises:
+        ValueError: If the year can not be read from the dataset id.
+    """
+    match = re.search(r"global_forest_change_(\d{4})_", dataset or "")
+    if not match:
+        raise ValueError(f"Unknown Hansen dataset: {dataset}")
+    return int(match.group(1))
@@ -1,20 +1,70 @@
 import importlib
 
+import orjson
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
 from rest_framework.views import APIView
 from rest_framework import viewsets
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework import status
+from rest_framework.fields import DateTimeField
+from rest_framework.pagination import LimitOffsetPagination
 
+from base import exports
 from base import session
+from v1.supply_chains.models.nodes import Farmer
+from . import metrics
+from . import tasks
 from .models import Farm
 from .models import FarmComment
+from .models import ReportSnapshot
 from .serializers import FarmSerializer
 from .serializers import FarmCommentSerializer
+from .constants import DETAIL_PAGE_SIZE
 from .constants import Pillers
 from .constants import template_files
 
+
+def metrics_view(request):
+    """
+    Serves the analysis pipeline metrics in the Prometheus text format.
+
+    Scrapers authenticate with the settings.METRICS_TOKEN bearer token, the
+    endpoint is disabled without one.
+    """
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    expected = f"Bearer {settings.METRICS_TOKEN}"
+    if request.headers.get("Authorization") != expected:
+        return HttpResponseForbidden()
+    output, content_type = metrics.generate_metrics()
+    return HttpResponse(output, content_type=content_type)
+
+
+def report_response(data, generated_on=None):
+    """
+    Returns a report response with the time the report was generated.
+
+    Args:
+        data (dict): The report data.
+        generated_on (datetime, optional): When the report was generated, 
+            defaults to now for reports computed in the request.
+
+    Returns:
+        Response: The response with a 'generated_at' field added.
+    """
+    generated_on = generated_on or timezone.now()
+    return Response({
+        **data, 
+        "generated_at": DateTimeField().to_representation(generated_on)
+    })
+
+
 class FarmViewSet(viewsets.ModelViewSet):
     """
     A viewset for handling CRUD operations on Farm objects.
@@ -49,6 +99,8 @@ class FarmViewSet(viewsets.ModelViewSet):
         """
         company = session.get_current_company()
         self.queryset = self.queryset.filter(farmer__company=company)
+        if settings.RAW_GEO_JSON:
+            self.queryset = self.queryset.with_raw_geo_json()
         return super().list(request, *args, **kwargs)
     
     
@@ -57,6 +109,9 @@ class FarmViewSet(viewsets.ModelViewSet):
         """
         Returns the geo_json values of the queryset.
 
+        With settings.RAW_GEO_JSON the JSON text of the values is copied into
+        the response without being decoded.
+
         Args:
             request: The HTTP request object.
 
@@ -66,7 +121,15 @@ class FarmViewSet(viewsets.ModelViewSet):
         queryset = self.get_queryset()
         company = session.get_current_company()
         queryset = queryset.filter(farmer__company=company)
-        data = queryset.values_list('geo_json', flat=True)
+        if settings.RAW_GEO_JSON:
+            texts = queryset.with_raw_geo_json().values_list(
+                'geo_json_text', flat=True)
+            data = [
+                None if text is None else orjson.Fragment(text)
+                for text in texts
+            ]
+        else:
+            data = queryset.values_list('geo_json', flat=True)
         return Response(data)
     
     @action(methods=['post'], detail=False, url_path='bulk-create')
@@ -79,6 +142,35 @@ class FarmViewSet(viewsets.ModelViewSet):
         self.perform_create(serializer)
         return Response('Data created.', status=status.HTTP_201_CREATED)
 
+    def perform_create(self, serializer):
+        """
+        Creates the farms and refreshes the reports of their companies, 
+        which count the farms still queued for analysis.
+        """
+        serializer.save()
+        farms = serializer.instance
+        if not isinstance(farms, list):
+            farms = [farms]
+        tasks.queue_report_refresh(
+            Farmer.objects.filter(
+                id__in={farm.farmer_id for farm in farms}
+            ).values_list('company_id', flat=True))
+
+    def perform_update(self, serializer):
+        """
+        Updates the farm and refreshes the reports of its company.
+        """
+        serializer.save()
+        tasks.queue_report_refresh([serializer.instance.farmer.company_id])
+
+    def perform_destroy(self, instance):
+        """
+        Deletes the farm and refreshes the reports of its company.
+        """
+        company_id = instance.farmer.company_id
+        instance.delete()
+        tasks.queue_report_refresh([company_id])
+
 
         
     
@@ -100,6 +192,31 @@ class FarmCommentViewSet(viewsets.ModelViewSet):
 
         """
         return super().get_queryset().filter_by_request(self.request)
+
+    def perform_create(self, serializer):
+        """
+        Creates the comment and refreshes the reports of the company of its
+        farm, the analysis details list the comments.
+        """
+        serializer.save()
+        tasks.queue_report_refresh(
+            [serializer.instance.farm.farmer.company_id])
+
+    def perform_update(self, serializer):
+        """
+        Updates the comment and refreshes the reports of its company.
+        """
+        serializer.save()
+        tasks.queue_report_refresh(
+            [serializer.instance.farm.farmer.company_id])
+
+    def perform_destroy(self, instance):
+        """
+        Deletes the comment and refreshes the reports of its company.
+        """
+        company_id = instance.farm.farmer.company_id
+        instance.delete()
+        tasks.queue_report_refresh([company_id])
     
 class StatAPIView(APIView):
     """
@@ -131,11 +248,28 @@ class StatAPIView(APIView):
             raise ValidationError("Piller is required.")
         if piller not in Pillers.values:
             raise ValidationError("Enter valid piller.")
+        company = session.get_current_company()
+        snapshot = ReportSnapshot.objects.get_snapshot(
+            company, piller, request.query_params)
+        if snapshot:
+            return report_response(snapshot.stats, snapshot.generated_on)
         queryset = Farm.objects.filter_by_request(request)
-        queryset = queryset.filter(
-            farmer__company=session.get_current_company())
+        queryset = queryset.filter(farmer__company=company)
         proccessor = importlib.import_module(template_files[piller])
-        return Response(proccessor.stats.get_data(queryset))
+        tasks.request_report_snapshot(company, piller, request.query_params)
+        return report_response(proccessor.stats.get_data(queryset))
+
+class AnalysisDetailPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination for the analysis detail table.
+
+    The table is built by the piller template rather than a serializer, so
+    only the limit and offset parsing of this class is used.
+    """
+
+    default_limit = DETAIL_PAGE_SIZE
+    max_limit = 1000
+
 
 class AnalysisViewSet(viewsets.ViewSet):
     """
@@ -180,17 +314,25 @@ class AnalysisViewSet(viewsets.ViewSet):
             raise ValidationError("Piller is required.")
         if piller not in Pillers.values:
             raise ValidationError("Enter valid piller.")
+        company = session.get_current_company()
+        snapshot = ReportSnapshot.objects.get_snapshot(
+            company, piller, request.query_params)
+        if snapshot:
+            return report_response(snapshot.analysis, snapshot.generated_on)
         queryset = Farm.objects.filter_by_request(request)
-        queryset = queryset.filter(
-            farmer__company=session.get_current_company())
+        queryset = queryset.filter(farmer__company=company)
         proccessor = importlib.import_module(template_files[piller])
-        return Response(proccessor.analysis.get_data(queryset))
+        tasks.request_report_snapshot(company, piller, request.query_params)
+        return report_response(proccessor.analysis.get_data(queryset))
     
     @action(methods=['get'], detail=False, url_path='details')
     def details(self, request):
         """
         Returns the detail data of the queryset.
 
+        The rows are paginated with the 'limit' and 'offset' query 
+        parameters.
+
         Args:
             request: The HTTP request object.
 
@@ -204,14 +346,66 @@ class AnalysisViewSet(viewsets.ViewSet):
             raise ValidationError("Piller is required.")
         if piller not in Pillers.values:
             raise ValidationError("Enter valid piller.")
+        company = session.get_current_company()
+        paginator = AnalysisDetailPagination()
+        limit = paginator.get_limit(request)
+        offset = paginator.get_offset(request)
+        if limit == DETAIL_PAGE_SIZE and not offset:
+            snapshot = ReportSnapshot.objects.get_snapshot(
+                company, piller, request.query_params)
+            if snapshot and method in snapshot.details:
+                data = {**snapshot.details[method], "title": _(criteria)}
+                return report_response(data, snapshot.generated_on)
         queryset = Farm.objects.filter_by_request(request)
-        queryset = queryset.filter(
-            farmer__company=session.get_current_company())
+        queryset = queryset.filter(farmer__company=company)
         proccessor = importlib.import_module(template_files[piller])
-        return Response(
-            proccessor.analysis_detail.get_data(queryset, method, criteria))
+        return report_response(
+            proccessor.analysis_detail.get_data(
+                queryset, method, criteria, limit=limit, offset=offset))
     
 
 
         
 
+
+    
+    @action(methods=['get'], detail=False, url_path='details/export')
+    def export_details(self, request):
+        """
+        Exports all rows of the detail table as a CSV or XLSX file.
+
+        The file type is selected with the 'file_type' query parameter, 
+        'csv' (default) or 'xlsx'. CSV files are streamed while the rows are 
+        read from the database.
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            A streaming response with the file as an attachment.
+
+        Raises:
+            ValidationError: If 'piller' or 'file_type' is invalid.
+        """
+        piller = request.GET.get('piller')
+        method = request.GET.get('method')
+        criteria = request.GET.get('criteria', '')
+        file_type = request.GET.get('file_type', 'csv').lower()
+        if not piller:
+            raise ValidationError("Piller is required.")
+        if piller not in Pillers.values:
+            raise ValidationError("Enter valid piller.")
+        if file_type not in ('csv', 'xlsx'):
+            raise ValidationError("Enter valid file type.")
+        queryset = Farm.objects.filter_by_request(request)
+        queryset = queryset.filter(
+            farmer__company=session.get_current_company())
+        proccessor = importlib.import_module(template_files[piller])
+        rows = proccessor.analysis_detail.get_export_rows(queryset, method)
+        filename = (f"{criteria or method or 'analysis-details'} "
+                    f"{timezone.now():%Y-%m-%d}.{file_type}")
+        if file_type == 'xlsx':
+            return exports.xlsx_response(
+                filename, proccessor.analysis_detail.TABLE_HEAD, rows)
+        return exports.csv_response(
+            filename, proccessor.analysis_detail.TABLE_HEAD, rows)
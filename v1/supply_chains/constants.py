@@ -7,4 +7,9 @@ class SyncStatus(models.IntegerChoices):
     STARTED = 1
     FAILED = 2
     IN_QUEUE = 3
-    COMPLETED = 4
\ No newline at end of file
+    COMPLETED = 4
+    DEAD_LETTER = 5
+
+class AnalysisPriority(models.IntegerChoices):
+    BACKGROUND = 0
+    INTERACTIVE = 10
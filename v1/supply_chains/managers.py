@@ -1,4 +1,10 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Exists, F, Max, Min, OuterRef, Q
+from django.utils import timezone
+
+from . import constants
+
 
 class BatchQuerySet(models.QuerySet):
     """
@@ -49,11 +55,157 @@ class BatchQuerySet(models.QuerySet):
         if supply_chain:
             self = self.filter(supply_chain_id=supply_chain)
         if country:
-            try:
-                self = self.filter(farmers__farms__country=country).distinct()
-            except:
-                self = self.filter(farmers__country=country).distinct()
+            self = self.filter(Exists(self.batch_farmers().filter(
+                farmer__farms__country=country)))
         return self
+
+    def filter_by_company(self, company):
+        """
+        Filter batches having at least one farmer of the given company.
+
+        The check is done as an ``EXISTS`` semi-join on the batch-farmer
+        link table, so batches are never duplicated by the join and no
+        ``DISTINCT`` over the full batch rows is needed.
+
+        Args:
+            company: The company (or company id) to filter by.
+
+        Returns:
+            QuerySet: The filtered queryset.
+        """
+        return self.filter(Exists(self.batch_farmers().filter(
+            farmer__company=company)))
+
+    def batch_farmers(self):
+        """
+        Returns the batch-farmer links correlated to the outer batch row.
+
+        Returns:
+            QuerySet: A queryset on the ``Batch.farmers`` through model, to be
+                used inside ``Exists``.
+        """
+        return self.model.farmers.through.objects.filter(
+            batch_id=OuterRef('pk'))
         
     
 
+
+
+class AnalysisQueueQuerySet(models.QuerySet):
+    """
+    A custom QuerySet for the AnalysisQueue model.
+
+    Entries are claimed by workers with a lease: a claimed entry is STARTED
+    until `lease_expires_on`, the worker renews the lease while it works on 
+    it, and entries whose lease expired are released back to the queue, so
+    a crashed worker never leaves entries STARTED for good.
+    """
+
+    def due(self):
+        """
+        Returns the queued entries that may be analysed now, skipping 
+        requeued entries waiting for their next attempt.
+        """
+        return self.filter(
+            Q(next_attempt_on__isnull=True) 
+            | Q(next_attempt_on__lte=timezone.now()),
+            status=constants.SyncStatus.IN_QUEUE)
+
+    def claim(self, limit, lease_duration, min_priority=None):
+        """
+        Claims due entries for the calling worker.
+
+        Only entries of the highest due priority are claimed, so interactive
+        edits never wait behind a bulk import. Within the priority the limit
+        is split evenly among the companies with due entries, the companies
+        waiting the longest getting the remainder, so one company importing
+        thousands of farms does not starve the others. The share a company 
+        can not use, having fewer due entries, is split again among the 
+        companies with entries left, so the limit is filled whenever enough
+        entries are due.
+
+        The entries are locked with `SELECT ... FOR UPDATE SKIP LOCKED`, so 
+        concurrent workers claim different entries instead of waiting for 
+        each other, and marked STARTED with a lease.
+
+        Args:
+            limit (int): The maximum number of entries to claim.
+            lease_duration (timedelta): The duration of the lease.
+            min_priority (int, optional): Only claim entries of this 
+                priority or higher, e.g. for the interactive lane.
+
+        Returns:
+            list: The ids of the claimed entries.
+        """
+        due = self.due()
+        if min_priority is not None:
+            due = due.filter(priority__gte=min_priority)
+        priority = due.aggregate(priority=Max("priority"))["priority"]
+        if priority is None:
+            return []
+        due = due.filter(priority=priority)
+        companies = [
+            company_id for company_id, _ in due.order_by().values_list(
+                "farm__farmer__company_id").annotate(
+                    oldest=Min("created_on")).order_by("oldest")[:limit]
+        ]
+        with transaction.atomic():
+            ids = []
+            while companies and len(ids) < limit:
+                share, extra = divmod(limit - len(ids), len(companies))
+                remaining = []
+                for index, company_id in enumerate(companies):
+                    size = share + (index < extra)
+                    if not size:
+                        remaining.append(company_id)
+                        continue
+                    claimed = list(due.filter(
+                        farm__farmer__company_id=company_id
+                    ).exclude(id__in=ids).select_for_update(
+                        skip_locked=True, of=("self",)
+                    ).order_by("created_on").values_list(
+                        "id", flat=True)[:size])
+                    ids += claimed
+                    if len(claimed) == size:
+                        remaining.append(company_id)
+                companies = remaining
+            self.filter(id__in=ids).update(
+                status=constants.SyncStatus.STARTED,
+                lease_expires_on=timezone.now() + lease_duration)
+        return ids
+
+    def renew_leases(self, ids, lease_duration):
+        """
+        Extends the leases of entries the calling worker still works on.
+
+        Args:
+            ids (list): The ids of the entries.
+            lease_duration (timedelta): The new duration of the leases.
+        """
+        self.filter(id__in=ids, status=constants.SyncStatus.STARTED).update(
+            lease_expires_on=timezone.now() + lease_duration)
+
+    def release_expired(self):
+        """
+        Returns the STARTED entries with an expired lease to the queue.
+
+        The worker that claimed them died or hung, which counts as a failed 
+        attempt, so an entry that keeps crashing its workers is moved to the
+        dead letter state after settings.ANALYSIS_MAX_ATTEMPTS attempts 
+        instead of being retried forever.
+
+        Returns:
+            int: The number of released entries.
+        """
+        expired = self.filter(
+            status=constants.SyncStatus.STARTED,
+            lease_expires_on__lt=timezone.now())
+        with transaction.atomic():
+            dead = expired.filter(
+                attempts__gte=settings.ANALYSIS_MAX_ATTEMPTS - 1).update(
+                    status=constants.SyncStatus.DEAD_LETTER, 
+                    attempts=F("attempts") + 1, lease_expires_on=None)
+            released = expired.update(
+                status=constants.SyncStatus.IN_QUEUE, 
+                attempts=F("attempts") + 1, lease_expires_on=None)
+        return dead + released
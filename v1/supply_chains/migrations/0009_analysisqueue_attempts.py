@@ -0,0 +1,28 @@
+# Generated by Django 4.0.4 on 2026-10-19 03:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supply_chains', '0008_analysisqueue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisqueue',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='analysisqueue',
+            name='next_attempt_on',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='analysisqueue',
+            name='status',
+            field=models.IntegerField(choices=[(1, 'Started'), (2, 'Failed'), (3, 'In Queue'), (4, 'Completed'), (5, 'Dead Letter')], default=3),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.4 on 2026-10-19 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supply_chains', '0009_analysisqueue_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisqueue',
+            name='lease_expires_on',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
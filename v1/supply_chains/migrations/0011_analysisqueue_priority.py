@@ -0,0 +1,22 @@
+# Generated by Django 4.0.4 on 2026-10-19 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supply_chains', '0010_analysisqueue_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisqueue',
+            name='priority',
+            field=models.IntegerField(choices=[(0, 'Background'), (10, 'Interactive')], default=0),
+        ),
+        migrations.AddIndex(
+            model_name='analysisqueue',
+            index=models.Index(fields=['status', 'priority', 'created_on'], name='analysis_queue_due'),
+        ),
+    ]
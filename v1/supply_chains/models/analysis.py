@@ -4,23 +4,44 @@ from base.models import AbstractBaseModel
 from v1.farms.models import Farm
 
 from .. import constants
+from ..managers import AnalysisQueueQuerySet
 
 
 class AnalysisQueue(AbstractBaseModel):
     """
-    Represents a batch in the supply chain.
+    Represents a farm waiting for analysis.
 
     Attributes:
-        external_id (str): The external ID of the batch.
-        farmers (ManyToManyField): The farmers associated with the batch.
-        supply_chain (ForeignKey): The supply chain to which the batch belongs.
+        farm (ForeignKey): The farm to analyse.
+        status (int): The sync status of the entry.
+        priority (int): The lane of the entry, interactive edits are 
+            analysed before background imports.
+        attempts (int): The number of failed attempts with temporary 
+            errors.
+        next_attempt_on (datetime): When a requeued entry may be retried.
+        lease_expires_on (datetime): When the claim of the worker analysing
+            a STARTED entry expires, unless renewed.
     """
 
     farm = models.ForeignKey(Farm, related_name="analysis_queue", on_delete=models.CASCADE)
     status = models.IntegerField(
         choices=constants.SyncStatus.choices, 
         default=constants.SyncStatus.IN_QUEUE)
+    priority = models.IntegerField(
+        choices=constants.AnalysisPriority.choices, 
+        default=constants.AnalysisPriority.BACKGROUND)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_on = models.DateTimeField(null=True, blank=True)
+    lease_expires_on = models.DateTimeField(null=True, blank=True)
+
+    objects = AnalysisQueueQuerySet.as_manager()
+
+    class Meta(AbstractBaseModel.Meta):
+        indexes = [
+            models.Index(
+                fields=['status', 'priority', 'created_on'], 
+                name='analysis_queue_due'),
+        ]
 
     def __str__(self) -> str:
         return f"{str(self.id)} - {str(self.status)}"
-
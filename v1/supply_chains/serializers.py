@@ -160,7 +160,7 @@ class UserInfoSerializer(IDModelSerializer):
         """Get default company"""
 
         company = get_current_company()
-        return company.id
+        return str(company.id)
     
     def get_theme(self, obj):
         """Get company theme"""
@@ -168,7 +168,7 @@ class UserInfoSerializer(IDModelSerializer):
         theme = Theme.objects.filter(company=get_current_company()).first()
         if not theme:
             theme = Theme.objects.filter(public_theme=True).last()
-        return theme.id
+        return str(theme.id)
     
     def get_calculated_farms(self, obj):
         """
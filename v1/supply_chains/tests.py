@@ -1,3 +1,172 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from v1.farms.models import Farm
+from v1.supply_chains.constants import AnalysisPriority, SyncStatus
+from v1.supply_chains.models.analysis import AnalysisQueue
+from v1.supply_chains.models.nodes import Company, Farmer
+
+LEASE = timedelta(minutes=10)
+
+
+class AnalysisQueueTestCase(TestCase):
+    """Creates companies with queued farms."""
+
+    def create_company(self, name):
+        company = Company.objects.create(
+            name=name, state="Ashanti", country="Ghana")
+        farmer = Farmer.objects.create(
+            name=name, company=company, state="Ashanti", country="Ghana")
+        return company, farmer
+
+    def queue(self, farmer, count, priority=AnalysisPriority.BACKGROUND,
+              age=timedelta(0), **kwargs):
+        """Queues `count` new farms of the farmer, created `age` ago."""
+        farms = Farm.objects.bulk_create(
+            Farm(farmer=farmer, external_id=str(index), state="Ashanti",
+                 country="Ghana")
+            for index in range(count))
+        entries = AnalysisQueue.objects.bulk_create(
+            AnalysisQueue(farm=farm, priority=priority, **kwargs)
+            for farm in farms)
+        ids = [entry.id for entry in entries]
+        AnalysisQueue.objects.filter(id__in=ids).update(
+            created_on=timezone.now() - age)
+        return ids
+
+
+class ClaimTest(AnalysisQueueTestCase):
+    """Tests the claim of due queue entries."""
+
+    def setUp(self):
+        self.company_a, self.farmer_a = self.create_company("A")
+        self.company_b, self.farmer_b = self.create_company("B")
+        self.company_c, self.farmer_c = self.create_company("C")
+
+    def claimed_by(self, ids):
+        """Returns the number of claimed entries per company."""
+        counts = {}
+        for company_id in AnalysisQueue.objects.filter(
+                id__in=ids).values_list("farm__farmer__company_id", flat=True):
+            counts[company_id] = counts.get(company_id, 0) + 1
+        return counts
+
+    def test_claims_the_highest_priority_first(self):
+        self.queue(self.farmer_a, 5, age=timedelta(hours=1))
+        interactive = self.queue(
+            self.farmer_b, 2, priority=AnalysisPriority.INTERACTIVE)
+
+        ids = AnalysisQueue.objects.claim(10, LEASE)
+
+        self.assertCountEqual(ids, interactive)
+
+    def test_min_priority_skips_lower_lanes(self):
+        self.queue(self.farmer_a, 5)
+
+        ids = AnalysisQueue.objects.claim(
+            10, LEASE, AnalysisPriority.INTERACTIVE)
+
+        self.assertEqual(ids, [])
+
+    def test_marks_entries_started_with_a_lease(self):
+        self.queue(self.farmer_a, 3)
+
+        ids = AnalysisQueue.objects.claim(2, LEASE)
+
+        entries = AnalysisQueue.objects.filter(id__in=ids)
+        self.assertEqual(len(ids), 2)
+        self.assertFalse(entries.exclude(status=SyncStatus.STARTED).exists())
+        self.assertFalse(entries.filter(lease_expires_on=None).exists())
+        self.assertEqual(len(AnalysisQueue.objects.claim(10, LEASE)), 1)
+
+    def test_skips_entries_waiting_for_a_retry(self):
+        self.queue(
+            self.farmer_a, 2,
+            next_attempt_on=timezone.now() + timedelta(minutes=5))
+        due = self.queue(
+            self.farmer_a, 1,
+            next_attempt_on=timezone.now() - timedelta(minutes=5))
+
+        self.assertEqual(AnalysisQueue.objects.claim(10, LEASE), due)
+
+    def test_splits_the_limit_among_companies(self):
+        self.queue(self.farmer_a, 100, age=timedelta(hours=3))
+        self.queue(self.farmer_b, 100, age=timedelta(hours=2))
+        self.queue(self.farmer_c, 100, age=timedelta(hours=1))
+
+        ids = AnalysisQueue.objects.claim(100, LEASE)
+
+        self.assertEqual(len(ids), 100)
+        self.assertEqual(self.claimed_by(ids), {
+            self.company_a.id: 34,
+            self.company_b.id: 33,
+            self.company_c.id: 33,
+        })
+
+    def test_gives_unused_share_to_other_companies(self):
+        self.queue(self.farmer_a, 1, age=timedelta(hours=2))
+        self.queue(self.farmer_b, 1000, age=timedelta(hours=1))
+        self.queue(self.farmer_c, 10)
+
+        ids = AnalysisQueue.objects.claim(100, LEASE)
+
+        self.assertEqual(len(ids), 100)
+        self.assertEqual(self.claimed_by(ids), {
+            self.company_a.id: 1,
+            self.company_b.id: 89,
+            self.company_c.id: 10,
+        })
+
+    def test_claims_the_oldest_entries_of_a_company(self):
+        old = self.queue(self.farmer_a, 2, age=timedelta(hours=1))
+        self.queue(self.farmer_a, 2)
+
+        self.assertCountEqual(AnalysisQueue.objects.claim(2, LEASE), old)
+
+
+@override_settings(ANALYSIS_MAX_ATTEMPTS=3)
+class ReleaseExpiredTest(AnalysisQueueTestCase):
+    """Tests the release of the entries of dead workers."""
+
+    def setUp(self):
+        _, self.farmer = self.create_company("A")
+
+    def test_returns_expired_entries_to_the_queue(self):
+        expired = self.queue(
+            self.farmer, 2, status=SyncStatus.STARTED, attempts=1,
+            lease_expires_on=timezone.now() - timedelta(seconds=1))
+        leased = self.queue(
+            self.farmer, 1, status=SyncStatus.STARTED,
+            lease_expires_on=timezone.now() + LEASE)
+
+        self.assertEqual(AnalysisQueue.objects.release_expired(), 2)
+
+        for entry in AnalysisQueue.objects.filter(id__in=expired):
+            self.assertEqual(entry.status, SyncStatus.IN_QUEUE)
+            self.assertEqual(entry.attempts, 2)
+            self.assertIsNone(entry.lease_expires_on)
+        entry = AnalysisQueue.objects.get(id=leased[0])
+        self.assertEqual(entry.status, SyncStatus.STARTED)
+        self.assertEqual(entry.attempts, 0)
+
+    def test_moves_entries_out_of_attempts_to_dead_letter(self):
+        last_attempt = self.queue(
+            self.farmer, 1, status=SyncStatus.STARTED, attempts=2,
+            lease_expires_on=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(AnalysisQueue.objects.release_expired(), 1)
+
+        entry = AnalysisQueue.objects.get(id=last_attempt[0])
+        self.assertEqual(entry.status, SyncStatus.DEAD_LETTER)
+        self.assertEqual(entry.attempts, 3)
+
+    def test_renewed_leases_are_not_released(self):
+        ids = self.queue(
+            self.farmer, 1, status=SyncStatus.STARTED,
+            lease_expires_on=timezone.now() - timedelta(seconds=1))
+
+        AnalysisQueue.objects.renew_leases(ids, LEASE)
+
+        self.assertEqual(AnalysisQueue.objects.release_expired(), 0)
@@ -182,9 +182,9 @@ class BatchViewSet(CustomScopeViewset):
         # Get the current company
         company = session.get_current_company()
         
-        # Filter the queryset by the company and make it distinct
-        self.queryset = self.queryset.filter(
-            farmers__company=company).distinct()
+        # Filter the queryset by the company, as a semi-join so batches are
+        # not duplicated per farmer
+        self.queryset = self.queryset.filter_by_company(company)
         
         # Call the list method of the superclass and return the result
         return super().list(request, *args, **kwargs)
@@ -1,9 +1,11 @@
 from django.utils.translation import gettext as _
-from django.db.models import Count
-from django.db.models import Q, Sum
+from django.contrib.postgres.aggregates import StringAgg
+from django.db.models import Count, Exists, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 
 from collections import defaultdict
 
+from base.db import server_side_iterator
 from ...farms.constants import Pillers
 from v1.farms import models as farm_models
 from v1.farms.constants import TreeCoverLossStandard
@@ -14,6 +16,16 @@ def round_off(value):
         value = round(value, 2)
     return value
 
+TABLE_HEAD = [
+    "Polygon ID",
+    "Commodity",
+    "Size (Ha)",
+    "Tree cover loss (Ha)",
+    "Province",
+    "Country",
+    "Note"
+]
+
 tree_cover_loss_methods = {
     'Rainforest Alliance': 'RAINFOREST_ALLIANCE',
     'Fairtrade': 'FAIRTRADE',
@@ -32,62 +44,154 @@ def get_description():
         mitigation.")
     return description
 
-def get_data(queryset, method, criteria):
-    tree_cover_losses = farm_models.YearlyTreeCoverLoss.objects.filter(
-        farm__in=queryset)
+def get_loss_queryset(method):
+    """
+    Returns the yearly tree cover losses counted for the given method.
+
+    Args:
+        method (str): The label of the tree cover loss method, e.g. 'EUDR'.
+
+    Returns:
+        QuerySet: The yearly tree cover losses matching the method filter.
+    """
     from v1.farms.managers import FarmFilter
+    tree_cover_losses = farm_models.YearlyTreeCoverLoss.objects.all()
     tree_cover_method = tree_cover_loss_methods.get(method, 'None')
     if tree_cover_method and tree_cover_method in FarmFilter:
-        tree_cover_losses = tree_cover_losses.filter(
-            **FarmFilter[tree_cover_method])
-    queryset = queryset.filter(
-        property__isnull=False, 
-        yearly_tree_cover_losses__in=tree_cover_losses)
-    data = queryset.annotate(
-        comments_count=Count(
-            'comments', 
-            filter=Q(comments__piller=Pillers.DEFORESTATION)
-        ),
-        tree_cover_loss_sum=Sum('yearly_tree_cover_losses__value')
-    ).values_list(
+        tree_cover_losses = tree_cover_losses.filter_by_standard(
+            tree_cover_method)
+    return tree_cover_losses
+
+
+def get_rows_queryset(queryset, method):
+    """
+    Returns one row per farm for the detail table.
+
+    Every per-farm value (loss sum, commodities and comment count) is a
+    correlated subquery, so no multi-valued relation is joined into the farm
+    rows. Joining them would repeat each farm once per loss year, supply
+    chain and comment, and inflate the sums.
+
+    Args:
+        queryset: The farms to list.
+        method (str): The label of the tree cover loss method.
+
+    Returns:
+        QuerySet: A values queryset of the table columns, keyed by farm id.
+    """
+    tree_cover_losses = get_loss_queryset(method).filter(
+        farm=OuterRef('pk'))
+    loss_sum = tree_cover_losses.order_by().values('farm').annotate(
+        total=Sum('value')).values('total')
+
+    FarmerSupplyChain = farm_models.Farm.farmer.field.related_model.\
+        supply_chains.through
+    commodities = FarmerSupplyChain.objects.filter(
+        farmer_id=OuterRef('farmer_id')).order_by().values(
+            'farmer_id').annotate(
+                names=StringAgg('supplychain__name', ', ', distinct=True)
+            ).values('names')
+
+    comments_count = farm_models.FarmComment.objects.filter(
+        farm=OuterRef('pk'), piller=Pillers.DEFORESTATION).order_by(
+            ).values('farm').annotate(count=Count('id')).values('count')
+
+    return queryset.filter(
+        Exists(tree_cover_losses), property__isnull=False
+    ).annotate(
+        commodity=Subquery(commodities),
+        tree_cover_loss_sum=Subquery(loss_sum),
+        comments_count=Coalesce(Subquery(comments_count), 0),
+    ).order_by('external_id', 'pk').values_list(
+        "id",
         "external_id", 
-        "farmer__supply_chains__name", 
+        "commodity", 
         "property__total_area",
         "tree_cover_loss_sum",
         "state", 
         "country", 
         "comments_count"
     )
-    FarmComment = queryset.model.comments.field.model
-    comments_qs = FarmComment.objects.filter(farm__in=queryset, 
-                                             piller=Pillers.DEFORESTATION)
-    comments = comments_qs.values("farm__external_id", "comment","file",
-                                  "source")
+
+
+def get_comments(farm_ids):
+    """
+    Returns the deforestation comments of the given farms grouped by farm.
+
+    Args:
+        farm_ids (list): The ids of the farms on the current page.
+
+    Returns:
+        dict: Comment values keyed by farm id.
+    """
+    comments = farm_models.FarmComment.objects.filter(
+        farm_id__in=farm_ids, piller=Pillers.DEFORESTATION
+    ).values("farm_id", "comment","file", "source")
     comments_dict = defaultdict(list)
 
     for comment in comments:
-        farm = comment.pop("farm__external_id")
+        farm = comment.pop("farm_id")
         comments_dict[farm].append(comment)
+    return comments_dict
+
+
+def get_data(queryset, method, criteria, limit=None, offset=0):
+    """
+    Retrieves and formats one page of the deforestation detail table.
+
+    Args:
+        queryset: The farms to list.
+        method (str): The label of the tree cover loss method.
+        criteria (str): The title of the table.
+        limit (int): The maximum number of rows to return. All rows are
+            returned when not given.
+        offset (int): The number of rows to skip.
+
+    Returns:
+        A dictionary containing the title, description and table data.
+    """
+    rows = get_rows_queryset(queryset, method)
+    count = rows.count()
+    if limit is not None:
+        rows = rows[offset:offset + limit]
+    elif offset:
+        rows = rows[offset:]
+    rows = list(rows)
+    comments_dict = get_comments([items[0] for items in rows])
 
     return {
         "title": _(criteria),
         "description": get_description(),
         "table": {
             "methods": TreeCoverLossStandard.labels,
-            "head": [
-                "Polygon ID",
-                "Commodity",
-                "Size (Ha)",
-                "Tree cover loss (Ha)",
-                "Province",
-                "Country",
-                "Note"
-            ],
+            "head": TABLE_HEAD,
+            "count": count,
+            "limit": limit,
+            "offset": offset,
             "rows": [
                         {
-                            "values": [round_off(item) for item in items],
+                            "values": [round_off(item) for item in items[1:]],
                             "comments": comments_dict[items[0]]
-                        } for items in data  
+                        } for items in rows  
                     ],
             }  
     }
+
+
+def get_export_rows(queryset, method):
+    """
+    Yields every row of the detail table for exporting.
+
+    The rows are read through a server-side cursor, so memory use does not
+    grow with the number of farms. The last column holds the comment count.
+
+    Args:
+        queryset: The farms to export.
+        method (str): The label of the tree cover loss method.
+
+    Yields:
+        list: The row values, in the order of ``TABLE_HEAD``.
+    """
+    rows = get_rows_queryset(queryset, method)
+    for items in server_side_iterator(rows):
+        yield [round_off(item) for item in items[1:]]